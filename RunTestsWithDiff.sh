@@ -14,4 +14,6 @@ for fullfile in "./Tests/*.in"; do
         echo -e 'Running test '$count'... \t' $input
         python './src/myShogi.py' -f './Tests/'$input | diff -u './Tests/'$output -
     done
-done
\ No newline at end of file
+done
+
+python './src/RegressionTests.py'
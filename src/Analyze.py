@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+
+import PieceUtils as piece_util
+import Search as search
+
+
+def score_root_move(arguments):
+    ''' Returns a tuple of (move, score, nodes) for one root move searched depth plies deep
+
+    The score is from the point of view of the player making the move. The plies after
+    the move are searched with iterative deepening so that the deeper searches start
+    with the best moves found by the shallower ones.
+    '''
+    board, move, depth = arguments
+    move_search = search.Search(board, time_ms=None)
+    board.make_move(move)
+    score = 0
+    for iteration_depth in range(depth):
+        score = -move_search.negamax(iteration_depth, -search.MATE_SCORE - 1, search.MATE_SCORE + 1, 1)
+    board.unmake_move()
+    return move, score, move_search.nodes
+
+
+def analyze_position(board, depth, num_workers=1):
+    ''' Returns a list of (move, score, nodes) for every legal move, best move first
+
+    Every root move is searched on its own with a full window, so the scores are exact
+    rather than bounds and the moves can be ranked. With more than one worker the root
+    moves are split over a pool of processes; 0 workers uses one process per core.
+    '''
+    moves = piece_util.generate_legal_moves(board)
+    tasks = [(board, move, depth) for move in moves]
+
+    if num_workers == 0:
+        num_workers = multiprocessing.cpu_count()
+    if num_workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.map(score_root_move, tasks, chunksize=1)
+    else:
+        results = [score_root_move(x) for x in tasks]
+    return sorted(results, key=lambda x: (-x[1], piece_util.convert_move_to_string(x[0])))
+
+
+def run_analysis(board, depth, num_workers=1):
+    ''' Return type void
+
+    Prints every legal move with its score and the number of nodes searched for it,
+    best move first, followed by the total number of nodes, the time taken and the
+    number of nodes per second.
+    '''
+    start_time = time.time()
+    results = analyze_position(board, max(depth, 1), num_workers)
+    elapsed_time = time.time() - start_time
+    nodes = sum(x[2] for x in results)
+
+    for move, score, move_nodes in results:
+        print(piece_util.convert_move_to_string(move) + ": " + str(score) + " (" + str(move_nodes) + " nodes)")
+    print("")
+    print("Depth: " + str(depth))
+    print("Nodes: " + str(nodes))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Nodes/second: " + str(int(nodes / elapsed_time) if elapsed_time > 0 else nodes))
@@ -0,0 +1,113 @@
+import contextlib
+import glob
+import io
+import multiprocessing
+import os
+import time
+
+import Game as game
+import Utils as utils
+
+
+def find_game_files(path):
+    ''' Returns a sorted list of the .in files in a directory or matching a glob pattern '''
+    if os.path.isdir(path):
+        path = os.path.join(path, '*.in')
+    return sorted(x for x in glob.glob(path) if x.endswith('.in'))
+
+
+def play_game_file(filename):
+    ''' Returns everything a game printed when it was played from the given file
+
+    The game is played exactly like `myShogi.py -f filename` but in the current
+    interpreter with a new Game, so no state is shared between files. If the game
+    exits early (e.g. because the file can't be parsed), the output up to that
+    point is returned.
+    '''
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            game_instance = game.Game('f', filename)
+            game_instance.run()
+        except SystemExit:
+            pass
+    return output.getvalue()
+
+
+def check_game_file(filename):
+    ''' Returns a tuple of (filename, passed, seconds) after comparing the game output with the .out file '''
+    start_time = time.time()
+    output = play_game_file(filename)
+    expected_filename = filename[:-len('.in')] + '.out'
+
+    try:
+        with open(expected_filename) as f:
+            passed = f.read() == output
+    except IOError:
+        passed = False
+    return filename, passed, time.time() - start_time
+
+
+def run_batch(path, num_workers=1):
+    ''' Return type boolean indicating whether every game file passed
+
+    Plays every .in file in a directory or matching a glob pattern and prints whether
+    its output matches the .out file next to it, followed by the number of files that
+    passed and the total wall time. With more than one worker the files are split over
+    a pool of processes; 0 workers uses one process per core.
+    '''
+    filenames = find_game_files(path)
+    if not filenames:
+        print("No .in files found at " + str(path) + ".")
+        return False
+
+    if num_workers == 0:
+        num_workers = multiprocessing.cpu_count()
+
+    start_time = time.time()
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.map(check_game_file, filenames)
+    else:
+        results = [check_game_file(x) for x in filenames]
+    elapsed_time = time.time() - start_time
+
+    num_passed = 0
+    for filename, passed, seconds in results:
+        num_passed += passed
+        print(("PASS" if passed else "FAIL") + " " + filename + " (" + "{:.3f}".format(seconds) + " seconds)")
+    print("")
+    print("Passed: " + str(num_passed) + "/" + str(len(results)))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    return num_passed == len(results)
+
+
+def run_games(path):
+    ''' Return type void
+
+    Replays every game in a file of many games, or in the .in files of a directory,
+    without printing the boards, and prints how many games ended in each way, the
+    number of moves made, the time taken and the number of moves per second. The
+    games are read one at a time, so any number of them can be replayed.
+    '''
+    start_time = time.time()
+    num_games = 0
+    num_moves = 0
+    game_over_messages = dict()
+    for test_case in utils.iterateTestCases(path):
+        game_instance = game.Game('f', test_case=test_case)
+        game_instance.replay()
+        game_instance.check_game_over_status()
+        num_games += 1
+        num_moves += game_instance.num_moves
+        message = game_instance.game_over_message if game_instance.is_game_over else "Not over."
+        game_over_messages[message] = game_over_messages.get(message, 0) + 1
+    elapsed_time = time.time() - start_time
+
+    for message in sorted(game_over_messages):
+        print(message + " " + str(game_over_messages[message]))
+    print("")
+    print("Games: " + str(num_games))
+    print("Moves: " + str(num_moves))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Moves/second: " + str(int(num_moves / elapsed_time) if elapsed_time > 0 else num_moves))
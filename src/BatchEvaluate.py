@@ -0,0 +1,288 @@
+import sys
+import time
+
+import GameBoard as game_board
+import PieceUtils as piece_util
+import Player as player
+
+# numpy is only needed to evaluate positions in batches, so the game runs without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# every plane holds one piece name of one player, in the order of game_board.PIECE_NAMES
+PIECE_PLANES = game_board.PIECE_NAMES
+NUM_PIECE_PLANES = len(PIECE_PLANES)
+NUM_PLANES_PER_SIDE = NUM_PIECE_PLANES // 2
+PLANE_INDEX = dict((x, i) for i, x in enumerate(PIECE_PLANES))
+HAND_PIECES = ['g', 's', 'b', 'r', 'p']
+HAND_INDEX = dict((x, i) for i, x in enumerate(HAND_PIECES))
+
+# bonus in hundredths of a pawn for every rank a piece has moved up from its player's first rank
+ADVANCEMENT_VALUES = game_board.ADVANCEMENT_VALUES
+# bonus for every square a player attacks, counted once for every piece attacking it
+ATTACK_VALUE = 2
+# bonus for every attack on a square next to (or on) the other player's king
+KING_PRESSURE_VALUE = 15
+
+DEFAULT_CHUNK_SIZE = 1 << 14
+
+# sliders are handled one line of the board at a time, e.g. a rank or a diagonal
+LINE_LENGTH = max(game_board.NUM_ROWS, game_board.NUM_COLS)
+SLIDING_LINES = [('r', [(1, 0), (0, 1)]), ('b', [(1, 1), (1, -1)])]
+
+
+def check_numpy():
+    if numpy is None:
+        print("Evaluating positions in batches needs numpy, which is not installed. Exiting...")
+        sys.exit()
+
+
+def build_lines(file_step, rank_step):
+    ''' Returns the lines of squares running in a direction across the board, in order along the direction
+
+    Every line is padded to LINE_LENGTH with NUM_SQUARES, which stands for a square off the board.
+    '''
+    lines = []
+    for square in range(game_board.NUM_SQUARES):
+        file, rank = piece_util.convert_square_to_file_and_rank(square)
+        if piece_util.convert_file_and_rank_to_square(file - file_step, rank - rank_step) is not None:
+            continue
+        line = []
+        while square is not None:
+            line.append(square)
+            file, rank = file + file_step, rank + rank_step
+            square = piece_util.convert_file_and_rank_to_square(file, rank)
+        lines.append(line + [game_board.NUM_SQUARES] * (LINE_LENGTH - len(line)))
+    return lines
+
+
+def build_line_attacks():
+    ''' Returns the number of sliders attacking every spot of a line, for every way the line can be filled
+
+    The table is indexed by the occupied spots of the line as bits, times 2 ** LINE_LENGTH,
+    plus the spots holding one player's sliders as bits. A slider attacks every spot on
+    either side of it up to and including the first occupied one.
+    '''
+    line_attacks = numpy.zeros((1 << (2 * LINE_LENGTH), LINE_LENGTH), dtype=numpy.int32)
+    for occupied in range(1 << LINE_LENGTH):
+        for sliders in range(1 << LINE_LENGTH):
+            if sliders & ~occupied:
+                continue
+            index = occupied << LINE_LENGTH | sliders
+            for origin in range(LINE_LENGTH):
+                if not sliders >> origin & 1:
+                    continue
+                for step in [-1, 1]:
+                    spot = origin + step
+                    while 0 <= spot < LINE_LENGTH:
+                        line_attacks[index, spot] += 1
+                        if occupied >> spot & 1:
+                            break
+                        spot += step
+    return line_attacks
+
+
+class BatchEvaluator(object):
+    ''' Scores many positions at once with array operations instead of one position at a time
+
+    A batch of N positions is stored as piece planes, an array of shape (N, planes, 5, 5)
+    with a 1 where a piece is, indexed by [rank][file] like the squares of a Position,
+    and hand counts, an array of shape (N, 2, 5) with the number of each piece in hand
+    for each player. Every table the evaluation needs (piece values, piece-square values
+    and the squares each piece attacks) is built once as an array, so that scoring a
+    batch is a handful of sums, table lookups and matrix products over the whole batch
+    with no Python loop over positions. The only loops are over the players and the
+    directions the sliders move in.
+    '''
+    def __init__(self):
+        check_numpy()
+        num_squares = game_board.NUM_SQUARES
+
+        self.plane_values = numpy.array([game_board.PIECE_VALUES[x.lower()] * (1 if x.islower() else -1) for x in PIECE_PLANES], dtype=numpy.int32)
+        self.hand_values = numpy.array([game_board.HAND_VALUES[x] for x in HAND_PIECES], dtype=numpy.int32)
+
+        self.piece_square_values = numpy.zeros((NUM_PIECE_PLANES, game_board.NUM_ROWS, game_board.NUM_COLS), dtype=numpy.int32)
+        for plane, piece_name in enumerate(PIECE_PLANES):
+            value = ADVANCEMENT_VALUES.get(piece_name.lower(), 0)
+            for rank in range(game_board.NUM_ROWS):
+                if piece_name.islower():
+                    self.piece_square_values[plane, rank, :] = value * rank
+                else:
+                    self.piece_square_values[plane, rank, :] = -value * (game_board.NUM_ROWS - 1 - rank)
+
+        # step_attacks[side] maps the squares of every piece plane of the player to the
+        # squares its steps attack. The counts are small whole numbers, so they are exact
+        # as floats, which lets the products run on the fast floating point routines.
+        self.step_attacks = numpy.zeros((2, NUM_PLANES_PER_SIDE * num_squares, num_squares), dtype=numpy.float32)
+        for side in player.PLAYER:
+            for plane, piece_name in enumerate(PIECE_PLANES[side * NUM_PLANES_PER_SIDE:(side + 1) * NUM_PLANES_PER_SIDE]):
+                steps, _ = piece_util.map_piece_to_movement[piece_name.lower()]
+                for step in steps:
+                    for origin in range(num_squares):
+                        for destination in piece_util.STEP_MOVES[step, side][origin]:
+                            self.step_attacks[side, plane * num_squares + origin, destination] += 1
+
+        # the planes of the pieces that slide like a rook or a bishop, the lines they slide
+        # along and, for every square, where it is in the lines of each direction
+        self.sliding_planes = dict()
+        self.sliding_lines = dict()
+        self.line_spots = dict()
+        for piece, directions in SLIDING_LINES:
+            self.sliding_planes[piece] = [[PLANE_INDEX[x] for x in piece_util.ATTACKER_NAMES[side][piece]] for side in player.PLAYER]
+            lines = sum((build_lines(file_step, rank_step) for file_step, rank_step in directions), [])
+            spots = [x for line in lines for x in line]
+            self.sliding_lines[piece] = numpy.array(lines)
+            self.line_spots[piece] = [[i for i, x in enumerate(spots) if x == square] for square in range(num_squares)]
+            self.line_spots[piece] = numpy.array(self.line_spots[piece]).T
+        self.line_attacks = build_line_attacks()
+        self.spot_bits = 1 << numpy.arange(LINE_LENGTH, dtype=numpy.int32)
+
+        self.king_zone = numpy.eye(num_squares, dtype=numpy.int32)
+        for square in range(num_squares):
+            for destination in piece_util.STEP_MOVES['k', player.LOWER][square]:
+                self.king_zone[square, destination] = 1
+
+    def encode(self, positions):
+        ''' Returns a tuple of (piece planes, hand counts, side to move) arrays for a list of Positions '''
+        num_positions = len(positions)
+        piece_indexes = [(i, PLANE_INDEX[piece_name], square)
+                         for i, position in enumerate(positions)
+                         for square, piece_name in enumerate(position.squares) if piece_name]
+        hand_indexes = [(i, side, HAND_INDEX[piece_name.lower()])
+                        for i, position in enumerate(positions)
+                        for side in player.PLAYER
+                        for piece_name in position.captures[side]]
+
+        planes = numpy.zeros((num_positions, NUM_PIECE_PLANES, game_board.NUM_SQUARES), dtype=numpy.uint8)
+        if piece_indexes:
+            positions_index, planes_index, squares_index = numpy.array(piece_indexes).T
+            planes[positions_index, planes_index, squares_index] = 1
+        hands = numpy.zeros((num_positions, 2, len(HAND_PIECES)), dtype=numpy.uint8)
+        if hand_indexes:
+            positions_index, sides_index, pieces_index = numpy.array(hand_indexes).T
+            numpy.add.at(hands, (positions_index, sides_index, pieces_index), 1)
+        side_to_move = numpy.array([x.side_to_move for x in positions], dtype=numpy.uint8)
+        return planes.reshape(num_positions, NUM_PIECE_PLANES, game_board.NUM_ROWS, game_board.NUM_COLS), hands, side_to_move
+
+    def count_attacks(self, planes):
+        ''' Returns an array of shape (N, 2, squares) with the number of pieces of each player attacking each square '''
+        num_positions = planes.shape[0]
+        squares = planes.reshape(num_positions, NUM_PIECE_PLANES, game_board.NUM_SQUARES)
+        by_side = squares.reshape(num_positions, 2, NUM_PLANES_PER_SIDE * game_board.NUM_SQUARES).astype(numpy.float32)
+        attacks = numpy.matmul(by_side.transpose(1, 0, 2), self.step_attacks).transpose(1, 0, 2).astype(numpy.int32)
+
+        # the slider lookups read one line of the board at a time, and the squares off the
+        # board at the ends of the shorter lines are always empty
+        occupied = numpy.zeros((num_positions, game_board.NUM_SQUARES + 1), dtype=numpy.uint8)
+        occupied[:, :-1] = squares.sum(axis=1, dtype=numpy.uint8)
+        for piece, _ in SLIDING_LINES:
+            sliders = numpy.zeros((num_positions, 2, game_board.NUM_SQUARES + 1), dtype=numpy.uint8)
+            for side in player.PLAYER:
+                sliders[:, side, :-1] = squares[:, self.sliding_planes[piece][side], :].sum(axis=1, dtype=numpy.uint8)
+            lines = self.sliding_lines[piece]
+            occupied_bits = occupied[:, lines] @ self.spot_bits
+            slider_bits = sliders[:, :, lines] @ self.spot_bits
+            line_attacks = self.line_attacks[(occupied_bits[:, None, :] << LINE_LENGTH) | slider_bits]
+            line_attacks = line_attacks.reshape(num_positions, 2, -1)
+            for spots in self.line_spots[piece]:
+                attacks += line_attacks[:, :, spots]
+        return attacks
+
+    def evaluate(self, planes, hands, side_to_move):
+        ''' Returns a dict() of arrays with the score of every position and the terms that make it up
+
+        Dict contains the following:
+
+        material: the value of the pieces on the board and in hand
+        piece_square: the bonus for how far the pieces have moved up the board
+        attacks: array of shape (N, 2) with the number of attacks by each player
+        king_pressure: array of shape (N, 2) with the number of attacks on the squares around each player's king
+        score: the sum of every term, in favor of the side to move
+
+        Every term other than score is in favor of the lower player. material plus
+        piece_square is the score a Position keeps up to date as moves are made.
+        '''
+        num_positions = planes.shape[0]
+        squares = planes.reshape(num_positions, NUM_PIECE_PLANES, game_board.NUM_SQUARES).astype(numpy.int32)
+        hands = hands.astype(numpy.int32)
+
+        material = squares.sum(axis=2) @ self.plane_values
+        material += hands[:, player.LOWER] @ self.hand_values - hands[:, player.UPPER] @ self.hand_values
+        piece_square = squares.reshape(num_positions, -1) @ self.piece_square_values.reshape(-1)
+
+        attacks_by_square = self.count_attacks(planes)
+        attacks = attacks_by_square.sum(axis=2)
+
+        king_planes = squares[:, [PLANE_INDEX['k'], PLANE_INDEX['K']], :]
+        king_zones = king_planes @ self.king_zone
+        king_pressure = (attacks_by_square[:, ::-1, :] * king_zones).sum(axis=2)
+
+        score = material + piece_square
+        score += ATTACK_VALUE * (attacks[:, player.LOWER] - attacks[:, player.UPPER])
+        score += KING_PRESSURE_VALUE * (king_pressure[:, player.UPPER] - king_pressure[:, player.LOWER])
+        score = numpy.where(side_to_move == player.LOWER, score, -score)
+        return dict(material=material, piece_square=piece_square, attacks=attacks, king_pressure=king_pressure, score=score)
+
+    def evaluate_positions(self, positions):
+        ''' Returns an array with the score of every Position in favor of its side to move '''
+        return self.evaluate(*self.encode(positions))['score']
+
+
+def read_position_strings(filename):
+    ''' Yields the position strings in a file, one per line, skipping empty lines '''
+    try:
+        with open(filename) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+    except IOError:
+        print("There was an error reading the position file: " + str(filename) + ". Exiting...")
+        sys.exit()
+
+
+def evaluate_position_file(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Return type void
+
+    Scores every position string in a file, one per line, and prints the score in
+    favor of the player to move followed by the position, so the output can be used
+    to label positions. The positions are read and scored chunk_size at a time to
+    bound the memory used by the arrays. The number of positions, the time taken and
+    the number of positions per second are printed last.
+    '''
+    evaluator = BatchEvaluator()
+    start_time = time.time()
+    num_positions = 0
+
+    position_strings = []
+    for position_string in read_position_strings(filename):
+        position_strings.append(position_string)
+        if len(position_strings) == chunk_size:
+            num_positions += evaluate_position_strings(evaluator, position_strings)
+            position_strings = []
+    if position_strings:
+        num_positions += evaluate_position_strings(evaluator, position_strings)
+    elapsed_time = time.time() - start_time
+
+    print("")
+    print("Positions: " + str(num_positions))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Positions/second: " + str(int(num_positions / elapsed_time) if elapsed_time > 0 else num_positions))
+
+
+def evaluate_position_strings(evaluator, position_strings):
+    ''' Returns the number of positions scored after printing the score of each of them '''
+    positions = []
+    for position_string in position_strings:
+        parsed_position = game_board.parse_position_string(position_string)
+        if parsed_position is None:
+            print("The position string '" + position_string + "' is not valid. Exiting...")
+            sys.exit()
+        positions.append(parsed_position[0])
+
+    scores = evaluator.evaluate_positions(positions)
+    for position_string, score in zip(position_strings, scores.tolist()):
+        print(str(score) + " " + position_string)
+    return len(positions)
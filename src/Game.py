@@ -1,16 +1,21 @@
 import sys
-from copy import copy, deepcopy
 
 import GameBoard as game_board
 import Utils as utils
 import PieceUtils as piece_util
 import Player as player
+import TranspositionCache as transposition_cache
+import Search as search
+import MonteCarlo as monte_carlo
+import Tablebase as tablebase_util
 
 END_GAME = [CHECKMATE, ILLEGAL_MOVE, TOO_MANY_MOVES] = ['Checkmate', 'Illegal move', 'Too many moves']
 
 
 class Game(object):
-    def __init__(self, mode='i', filename=None, debug_mode=False):
+    def __init__(self, mode='i', filename=None, debug_mode=False, ai_player_name=None, ai_time_ms=search.DEFAULT_TIME_MS,
+                 ai_engine='alphabeta', ai_playouts=None, num_workers=1, tablebase=None,
+                 position_string=None, test_case=None):
         self.game_board = None
         self.mode = mode
         self.num_moves = 0
@@ -18,12 +23,27 @@ class Game(object):
         self.upper_player = None
         self.is_game_over = False
         self.game_over_message = None
+        self.game_over_reason = None
+        self.winning_player = None
         self.debug_mode = debug_mode
-
-        if mode is 'f' and filename:
-            try:
-                contents = utils.parseTestCase(filename)
-            except:
+        self.position_cache = transposition_cache.TranspositionCache()
+        self.ai_player = None
+        self.ai_time_ms = ai_time_ms
+        self.ai_engine = ai_engine
+        self.ai_playouts = ai_playouts
+        self.num_workers = num_workers
+        self.tablebase = tablebase
+        self.search_cache = None
+
+        if mode == 'f' and (filename or test_case):
+            # a game that was already read, e.g. by utils.iterateTestCases, is used as it is
+            contents = test_case
+            if contents is None:
+                try:
+                    contents = utils.parseTestCase(filename)
+                except:
+                    contents = None
+            if contents is None:
                 print("There was an error parsing the input file: " + str(filename) + ". Exiting...")
                 sys.exit()
 
@@ -32,7 +52,19 @@ class Game(object):
             self.lower_player = player.Player('lower', contents['lowerCaptures'])
             self.upper_player = player.Player('UPPER', contents['upperCaptures'])
             self.game_board = game_board.GameBoard(False, initialPieces)
-        elif mode is 'i':
+        elif mode == 'p' and position_string:
+            parsed_position = game_board.parse_position_string(position_string)
+            if parsed_position is None:
+                print("There was an error parsing the position: " + str(position_string) + ". Exiting...")
+                sys.exit()
+
+            position, move_number = parsed_position
+            self.moves = []
+            self.num_moves = move_number - 1
+            self.lower_player = player.Player('lower', position.captures[player.LOWER])
+            self.upper_player = player.Player('UPPER', position.captures[player.UPPER])
+            self.game_board = game_board.GameBoard(False, position=position)
+        elif mode == 'i':
             self.game_board = game_board.GameBoard()
             self.lower_player = player.Player('lower')
             self.upper_player = player.Player('UPPER')
@@ -40,11 +72,23 @@ class Game(object):
             print("Game mode '" + str(mode) + "' not recognized.")
             sys.exit()
 
-        self.lower_player.set_pieces(self.game_board.lower_pieces)
-        self.upper_player.set_pieces(self.game_board.upper_pieces)
-        self.game_board.clear_player_pieces()
         self.game_board = self.game_board.board
-        self.current_player = self.lower_player
+        self.game_board.set_captures(self.lower_player.captures, self.upper_player.captures)
+        self.current_player = self.upper_player if self.game_board.side_to_move is player.UPPER else self.lower_player
+        # a file can't start with the UPPER player in check when it is lower's turn, or the king could be captured
+        if mode == 'f' and piece_util.is_in_check(self.game_board, self.get_opposing_player().get_side()):
+            if filename:
+                print("There was an error parsing the input file: " + str(filename) + ". Exiting...")
+            else:
+                print("There was an error parsing a game of the input file: the UPPER king is in check on lower's turn. Exiting...")
+            sys.exit()
+        # a game can start from a position where the player to move is already in check or checkmate
+        if mode == 'p':
+            self.is_opponent_in_check(self.game_board, self.get_opposing_player())
+
+        if ai_player_name is not None:
+            self.ai_player = self.lower_player if ai_player_name == self.lower_player.get_name() else self.upper_player
+            self.search_cache = transposition_cache.TranspositionCache(search.DEFAULT_CACHE_ENTRIES)
 
     def increment_num_moves(self):
         self.num_moves += 1
@@ -59,7 +103,17 @@ class Game(object):
 
 
     def get_and_print_escape_moves(self, current_player):
-        escape_moves = current_player.get_escape_moves()
+        # the escape moves are only generated here, when they are printed, and not when checking for checkmate
+        escape_moves = self.get_escape_moves()
+        self.print_escape_moves(current_player, escape_moves)
+
+
+    def get_escape_moves(self):
+        ''' Returns the list of move tuples that get the current player out of check '''
+        return self.get_legal_moves(self.game_board)
+
+
+    def print_escape_moves(self, current_player, escape_moves):
         current_player_escape_moves = self.generate_possible_escape_move_strings(current_player, escape_moves)
         print(current_player.get_name() + " player is in check!")
         print("Available moves:")
@@ -67,13 +121,6 @@ class Game(object):
             print(move)
 
 
-    def get_possible_piece_moves(self, current_player, board):
-        moves = []
-        for piece_name, location in current_player.get_pieces().items():
-            moves += piece_util.generate_moves_by_piece(piece_name, location, current_player, board, False)
-        return moves
-
-
     def simulate(self):
         ''' Return type void
 
@@ -88,19 +135,11 @@ class Game(object):
             if self.current_player.is_in_checkmate():
                 self.set_game_over_status(CHECKMATE)
                 break
-            if self.num_moves >= 400:
+            if self.num_moves >= game_board.MAX_MOVES:
                 self.set_game_over_status(TOO_MANY_MOVES)
                 break
 
-            action, action_param_1, action_param_2, action_param_3 = self.parse_move_input(move)
-            self.game_board, move_was_made = self.update_game_with_action(self.game_board, action, action_param_1, action_param_2, action_param_3)
-            
-            if not move_was_made:
-                self.set_game_over_status(ILLEGAL_MOVE)
-
-            self.is_opponent_in_check(self.game_board, self.current_player)
-            self.switch_current_player()
-            self.increment_num_moves()
+            self.play_move(move)
 
             if self.is_game_over:
                 self.print_last_action(self.game_board, self.lower_player.captures, self.upper_player.captures, move)
@@ -113,6 +152,47 @@ class Game(object):
         self.moves = None
 
 
+    def replay(self, on_move=None):
+        ''' Return type void
+
+        Plays all of the moves read from the input file without printing the game board,
+        so that the resulting position can be analyzed. The replay stops early if one of
+        the terminating conditions is hit. If on_move is given, it is called with every
+        move string right after the move is played.
+        '''
+        for move in self.moves:
+            if self.is_game_over:
+                break
+            if self.current_player.is_in_checkmate():
+                self.set_game_over_status(CHECKMATE)
+                break
+            if self.num_moves >= game_board.MAX_MOVES:
+                self.set_game_over_status(TOO_MANY_MOVES)
+                break
+            self.play_move(move)
+            if on_move is not None:
+                on_move(move)
+        self.moves = None
+
+
+    def play_move(self, move):
+        ''' Return type void
+
+        Takes a single action for the current player, checks whether it put the opposing
+        player in check or checkmate and then passes the turn to the opposing player. If
+        the action could not be taken, the game is over because of an illegal move.
+        '''
+        action, action_param_1, action_param_2, action_param_3 = self.parse_move_input(move)
+        self.game_board, move_was_made = self.update_game_with_action(self.game_board, action, action_param_1, action_param_2, action_param_3)
+
+        if not move_was_made:
+            self.set_game_over_status(ILLEGAL_MOVE)
+        else:
+            self.is_opponent_in_check(self.game_board, self.current_player)
+        self.switch_current_player()
+        self.increment_num_moves()
+
+
     def run(self):
         ''' Return type void
 
@@ -130,16 +210,19 @@ class Game(object):
             self.print_last_action(self.game_board, self.lower_player.captures, self.upper_player.captures)
 
         while not self.is_game_over:
-            if self.current_player.is_in_checkmate():
-                self.set_game_over_status(CHECKMATE)
+            if not self.begin_turn():
                 break
 
-            if self.current_player.is_in_check():
-                self.get_and_print_escape_moves(self.current_player)
-
-            if self.num_moves >= 400:
-                self.set_game_over_status(TOO_MANY_MOVES)
-                break
+            if self.current_player is self.ai_player:
+                # a computer player who isn't in check but can't move can only play an illegal move, which loses the game
+                if not piece_util.has_legal_move(self.game_board):
+                    self.set_game_over_status(ILLEGAL_MOVE)
+                    break
+                move = self.find_ai_move()
+                print(self.current_player.get_name() + "> " + move)
+                self.play_move(move)
+                self.print_last_action(self.game_board, self.lower_player.captures, self.upper_player.captures, move)
+                continue
 
             if self.mode == 'f':
                 # NOTE: This is here for the purpose of testing output in -f mode to make sure that the game would
@@ -148,153 +231,121 @@ class Game(object):
                 return
             else:
                 move = input(self.current_player.get_name() + "> ")
-                action, action_param_1, action_param_2, action_param_3 = self.parse_move_input(move)
-                # attempts to take an action that does not allow the current player to get out of check
-                if self.current_player.is_in_check() and action_param_2 not in self.current_player.get_escape_moves():
-                    if self.debug_mode:
-                        print(self.current_player.get_name() + " is in check and did not make a move to get them out.")
-                    self.set_game_over_status(ILLEGAL_MOVE)
-                    break
-
-                self.game_board, move_was_made = self.update_game_with_action(self.game_board, action, action_param_1, action_param_2, action_param_3)
-                
-                if not move_was_made:
-                    self.set_game_over_status(ILLEGAL_MOVE)
-
-                self.is_opponent_in_check(self.game_board, self.current_player)
-                self.switch_current_player()
-                self.increment_num_moves()
+                self.play_move(move)
                 self.print_last_action(self.game_board, self.lower_player.captures, self.upper_player.captures, move)
 
                 if move is None:
                     self.set_game_over_status(ILLEGAL_MOVE)
                     return
 
+        if self.debug_mode:
+            print("Position cache stats: " + str(self.position_cache.get_stats()))
         print(self.game_over_message)
 
 
+    def begin_turn(self):
+        ''' Returns a boolean regarding whether the current player can make a move
+
+        Ends the game if the current player is in checkmate or the move limit has been
+        reached. If the current player is in check, the moves that escape check are printed.
+        '''
+        if self.current_player.is_in_checkmate():
+            self.set_game_over_status(CHECKMATE)
+            return False
+
+        if self.current_player.is_in_check():
+            self.get_and_print_escape_moves(self.current_player)
+
+        if self.num_moves >= game_board.MAX_MOVES:
+            self.set_game_over_status(TOO_MANY_MOVES)
+            return False
+        return True
+
+
+    def find_ai_move(self):
+        ''' Returns the move chosen by the search for the computer player as a move string
+
+        The alpha-beta search results are kept between moves so that the next search starts
+        with what this one learned. With the 'mcts' engine, Monte Carlo tree search is used
+        instead, split over the given number of worker processes. In debug mode, the nodes
+        or playouts searched per second are printed.
+        '''
+        if self.ai_engine == 'mcts':
+            move = monte_carlo.best_move(self.game_board, self.num_moves, self.ai_playouts, self.ai_time_ms,
+                                         self.num_workers, report=self.debug_mode)
+        else:
+            move = search.best_move(self.game_board, self.ai_time_ms, cache=self.search_cache, report=self.debug_mode,
+                                    tablebase=self.tablebase)
+        return piece_util.convert_move_to_string(move)
+
+
     def update_game_with_action(self, board, action, action_param_1, action_param_2, action_param_3=None):
         ''' Return type 2D-array of updated game board and boolean indicating whether an action was taken
 
         This function handles deciding which action is trying to be taken by the current player and attempts
         to execute that action. This function lets the functions it calls tell it whether or not the move was successful.
+        The origin and destination of a move and the square of a drop are 0-24 square indices, as returned by
+        parse_move_input.
         '''
         if action == 'move':
-            board_origin = action_param_1
-            board_destination = action_param_2
+            origin = action_param_1
+            destination = action_param_2
             promotion_move = action_param_3
 
             if self.debug_mode:
-                print(self.current_player.get_name() + " wants to make the following move: " + " ".join([action, action_param_1, action_param_2]))
+                print(self.current_player.get_name() + " wants to make the following move: " + " ".join([action,
+                      game_board.convert_square_to_location(origin), game_board.convert_square_to_location(destination)]))
 
-            piece_name = piece_util.get_piece_at_location(board, board_origin)
+            piece_name = piece_util.get_piece_at_square(board, origin)
 
             if not piece_name:
                 if self.debug_mode:
-                    print("There was no piece at board location " + str(board_origin))
+                    print("There was no piece at board location " + game_board.convert_square_to_location(origin))
                 return board, False
 
-            move = [action, action_param_1, action_param_2, action_param_3]
-            board, move_was_made  = self.attempt_to_move_piece(board, piece_name, move, board_origin, board_destination)
+            board, move_was_made  = self.attempt_to_move_piece(board, piece_name, origin, destination, promotion_move is not None)
             return board, move_was_made
 
         elif action == 'drop':
             
             piece_name = action_param_1
-            drop_location = action_param_2
+            square = action_param_2
             
-            board, drop_was_made = self.attempt_to_drop_piece(piece_name, drop_location, board)
+            board, drop_was_made = self.attempt_to_drop_piece(piece_name, square, board)
             return board, drop_was_made
 
+        return board, False
 
-    def attempt_to_move_piece(self, board, piece_name, move, board_origin, board_destination):
+
+    def attempt_to_move_piece(self, board, piece_name, origin, destination, promotion_move=False):
         ''' Return type 2D-array of updated game board and boolean indicating whether an move was made
 
-        This function explicitly handles the logic for making a move. It checks all the extensive set of
-        rules regarding whether a move can be made or not.
+        This function explicitly handles the logic for making a move. The move is only made if it is
+        in the list of legal moves for the current player, which covers all of the rules regarding
+        where pieces can move, promotions and not leaving the king in check. A pawn that reaches the
+        last row is promoted even if the promotion is not asked for.
         '''
-        move = move[:-1] if move[3] is None else move
-
-        if piece_util.can_make_move(board, self.current_player, piece_name, board_origin, board_destination):
-            potential_moves = piece_util.generate_moves_by_piece(piece_name, board_origin, self.current_player, board, False)
-
-            if self.debug_mode:
-                print("Player " + self.current_player.get_name() + " has piece " + str(piece_name) + ", and potential moves: " + str(potential_moves))
+        promote = promotion_move or piece_util.should_pawn_be_promoted(piece_name, self.current_player, destination)
+        legal_move = (origin, destination, promote, None)
 
-            opposing_player_moves = []
-            if piece_name.lower() == 'k':
-                opposing_player = self.get_opposing_player()
-                opposing_player_moves = self.get_possible_piece_moves(opposing_player, board)
-            if board_destination in opposing_player_moves:
-                if self.debug_mode:
-                    print("Player " + self.current_player.get_name() + " was going to make a move to put them in check.")
-                return board, False
-            else:
-                if board_destination in potential_moves:
-                    if len(move) > 3 or piece_util.should_pawn_be_promoted(piece_name, self.current_player, board_destination):
-                        if piece_util.can_be_promoted(piece_name, board_origin, board_destination):
-                            temp_piece_name = piece_name
-                            piece_name = piece_util.promote_piece(piece_name)
-
-                            self.update_player_piece(self.current_player, temp_piece_name, board_destination)
-                        else:
-                            if self.debug_mode:
-                                print(self.current_player.name + " tried to illegally promote " + str(piece_name) + ".")
-                            return board, False
-                    else:
-                        if self.debug_mode:
-                            print("Promotion of " + str(piece_name) + " invalid...")
-                    
-                    destination_piece = piece_util.get_piece_at_location(board, board_destination)
-                    if destination_piece is not None:
-                        if not piece_util.piece_owned_by_player(self.current_player, destination_piece):
-                            
-                            # "unpromotes" a promoted piece upon capturing
-                            captured_piece = destination_piece if len(destination_piece) == 1 else destination_piece[1:]
-                            
-                            if captured_piece is not '':
-                                self.update_player_captures(self.current_player, captured_piece, destination_piece)
-                        else:
-                            if self.debug_mode:
-                                print("Move (" + str(move) + ") attempted by " + self.current_player.name + ", but they already own " + str(destination_piece))
-                            return board, False
-                    opposing_player = self.get_opposing_player()
-                    board = piece_util.make_move(board, piece_name, board_origin, board_destination)
-                    self.update_player_piece(self.current_player, piece_name, board_destination)
-                else:
-                    if self.debug_mode:
-                        print("Destination (" + str(board_destination) + ") not in potential moves: " + str(potential_moves))
-                    return board, False
-        else:
+        if legal_move not in self.get_legal_moves(board):
             if self.debug_mode:
-                print(self.current_player.name + " cannot move " + str(piece_name))
+                print(self.current_player.name + " cannot make the move " + piece_util.convert_move_to_string(legal_move) + " with " + str(piece_name) + ".")
             return board, False
-        return board, True
-
-
-    def update_player_piece(self, current_player, piece_name, location):
-        if current_player is self.lower_player:
-            self.lower_player.update_pieces(piece_name, location)
-            if self.debug_mode:
-                print(str(piece_name) + " updated in lower_pieces at " + location)
-        else:
-            self.upper_player.update_pieces(piece_name, location)
-            if self.debug_mode:
-                print(str(piece_name) + " updated in upper_pieces at " + location)
 
-
-    def update_player_captures(self, current_player, captured_piece, destination_piece):
-        if current_player is self.lower_player:
-            captured_piece = captured_piece.lower()
-            self.upper_player.remove_from_pieces(destination_piece)
-            self.lower_player.add_to_captures(captured_piece)
-        else:
-            captured_piece = captured_piece.upper()
-            self.lower_player.remove_from_pieces(destination_piece)
-            self.upper_player.add_to_captures(captured_piece)
+        # a captured piece is "unpromoted" and added to the current player's captures by the board
+        board = piece_util.make_move(board, origin, destination, promote)
+        return board, True
 
 
     def parse_move_input(self, action):
+        ''' Returns a tuple of (action, param 1, param 2, param 3) parsed from a move typed by a player
+
+        Board locations like 'a1' are converted to 0-24 square indices here, so nothing past this
+        point works with board location strings. For a move, the params are the origin square, the
+        destination square and the promotion word or None. For a drop, they are the piece name, the
+        square and None. If the action can't be parsed, every element of the tuple is None.
+        '''
         try:
             action = action.split(' ')
             # The max action can be is 4 because of a promotion
@@ -304,172 +355,93 @@ class Game(object):
                 if self.debug_mode:
                     print(self.current_player.get_name() + " tried to take an unrecognized action: " + action[0])
                 return None, None, None, None
+
+            destination = game_board.convert_location_to_square(action[2])
+            origin = game_board.convert_location_to_square(action[1]) if action[0] == 'move' else action[1]
+            if destination is None or origin is None:
+                if self.debug_mode:
+                    print(self.current_player.get_name() + " gave a board location that doesn't exist: " + " ".join(action))
+                return None, None, None, None
+
             if len(action) == 3:
-                return action[0], action[1], action[2], None
+                return action[0], origin, destination, None
             else:
-                return action[0], action[1], action[2], action[3]
+                return action[0], origin, destination, action[3]
         except:
             return None, None, None, None
 
 
-    def attempt_to_drop_piece(self, piece_name, drop_location, board):
+    def attempt_to_drop_piece(self, piece_name, square, board):
         ''' Return type 2D-array of updated game board and boolean indicating whether a drop was made
 
-        This function explicitly handles the logic for dropping a piece out of captures. It checks all 
-        the extensive set of rules regarding whether a drop can be made or not.
+        This function explicitly handles the logic for dropping a piece out of captures. The drop
+        is only made if it is in the list of legal moves for the current player, which covers all of
+        the rules regarding where pieces, and especially pawns, can be dropped.
         '''
-        if piece_util.can_drop_piece(self.game_board, piece_name, self.current_player, drop_location, self.lower_player.captures, self.upper_player.captures):
-            self.game_board = piece_util.drop_piece(board, self.current_player, piece_name, drop_location)
+        if self.current_player is self.upper_player:
+            piece_name = piece_name.upper()
+        legal_move = (None, square, False, piece_name)
 
-            if self.current_player is self.upper_player:
-                piece_name = piece_name.upper()
-                self.upper_player.captures.remove(piece_name)
-                self.upper_player.update_pieces(piece_name, drop_location)
-            else:
-                self.lower_player.captures.remove(piece_name)
-                self.lower_player.update_pieces(piece_name, drop_location)
-        else:
+        if legal_move not in self.get_legal_moves(board):
             if self.debug_mode:
                 print(self.current_player.name + " cannot drop " + str(piece_name))
             return board, False
+
+        board = piece_util.drop_piece(board, self.current_player, piece_name, square)
         return board, True
 
 
+    def get_legal_moves(self, board):
+        ''' Returns the list of legal moves for the side to move, reusing it if the position was seen before '''
+        cache_key = ('legal_moves', board.hash)
+        legal_moves = self.position_cache.get(cache_key)
+        if legal_moves is None:
+            legal_moves = piece_util.generate_legal_moves(board)
+            self.position_cache.put(cache_key, legal_moves)
+        return legal_moves
+
+
     def is_opponent_in_check(self, board, current_player):
         ''' Return type void
 
         This function checks whether or not the opposing player is in check.
-        If the player is in check, then moves are generated to escape check. 
-        If there exist moves to escape check, then is_opponent_in_checkmate
-        to validate that the moves will actually result in avoiding checkmate.
+        If the player is in check and has no legal move that escapes check,
+        the opposing player is in checkmate. Finding out only needs one legal
+        move, so the full list of escape moves isn't generated here.
         '''
-        opposing_player, king = (self.upper_player, 'K') if current_player is self.lower_player else (self.lower_player, 'k')
-        current_player_moves = self.get_possible_piece_moves(self.current_player, board)
-        current_player_moves = [x for x in list(set(current_player_moves)) if x not in current_player.get_pieces().values()]
-        king_loc = opposing_player.get_piece_location(king)
+        opposing_player = self.upper_player if current_player is self.lower_player else self.lower_player
 
-        if king_loc in current_player_moves:
-            escape_moves, drop_moves = self.find_moves_to_escape_check(king, king_loc, opposing_player, current_player, board)
-            opposing_player.in_check = True
-
-            if not escape_moves:
-                opposing_player.in_checkmate = True
-            else:
-                self.is_opponent_in_checkmate(board, king, current_player, current_player_moves, escape_moves, drop_moves)
+        # the check status of a player only depends on the position, so repeated positions reuse it
+        cache_key = ('check', board.hash, opposing_player.side)
+        check_status = self.position_cache.get(cache_key)
+        if check_status is not None:
+            opposing_player.in_check, opposing_player.in_checkmate = check_status
+            return
 
+        opposing_player.in_check = piece_util.is_in_check(board, opposing_player.side)
 
-    def is_opponent_in_checkmate(self, board, king, current_player, current_player_moves, escape_moves, drop_moves):
-        ''' Return type void
-
-        This function only gets called when the opposing player is in check.
-        Thus, this function checks whether or not the opposing player is in
-        checkmate based on the moves to escape check generated in the
-        is_opponent_in_check function. If the opposing player is in checkmate,
-        then the in_checkmate attribute of the opposing player is set to True,
-        If the opposing player is not in checkmate, the escape_moves attribute
-        is set to the escape moves generated.
-        '''
-        num_pieces_in_checkmate = 0
-        for move_from, end_locs in escape_moves.items():
-            for move_to in end_locs:
-                temp_board = deepcopy(board)
-                temp_pieces = copy(current_player.get_pieces())
-                temp_moves = current_player_moves
-                col, row = piece_util.convert_board_pos_to_index(move_to[1]), piece_util.convert_board_pos_to_index(game_board.map_char_to_num[move_to[0]])
-
-                if temp_board[row][col] != '':
-                    piece_to_remove = temp_board[row][col]
-                    temp_pieces.pop(piece_to_remove, None)
-                    piece_name =  piece_util.get_piece_at_location(temp_board, move_from)
-                    temp_board = piece_util.make_move(temp_board, piece_name, move_from, move_to)
-
-                    for temp_piece_name, temp_loc in temp_pieces.items():
-                        temp_moves += piece_util.generate_moves_by_piece(temp_piece_name, temp_loc, current_player, temp_board, False)
-                    if move_to in temp_moves:
-                        num_pieces_in_checkmate += 1
-        opposing_player = self.get_opposing_player()
-        king_loc = opposing_player.get_piece_location(king)
-        # void any drop locations that the current player already has pieces at
-        drop_moves = [x for x in drop_moves if x not in current_player.get_pieces().values()]
-        for piece in opposing_player.captures:
-            for drop in drop_moves:
-                temp_board = deepcopy(board)
-                temp_captures = copy(opposing_player.captures)
-                temp_moves = list()
-                temp_board = piece_util.drop_piece(temp_board, current_player, piece, drop)
-                
-                for temp_piece_name, temp_loc in current_player.get_pieces().items():
-                    temp = piece_util.generate_moves_by_piece(temp_piece_name, temp_loc, current_player, temp_board, False)
-                    temp_moves += temp
-                temp_moves = [x for x in list(set(temp_moves)) if x not in current_player.get_pieces().values()]
-
-                if king_loc in temp_moves:
-                    drop_moves.remove(drop)
-        # if number of pieces in checkmates are equal to the number of moves to escape, 
-        # then there is no place to go and game is over
-        if num_pieces_in_checkmate == (len(escape_moves.values()) + len(drop_moves)):
+        # the tablebase knows whether a position with its material is checkmate without generating any moves
+        if opposing_player.in_check and self.tablebase is not None and self.tablebase.probe(board) == (tablebase_util.LOSS, 0):
+            opposing_player.in_checkmate = True
+        elif opposing_player.in_check and not piece_util.has_legal_move(board):
             opposing_player.in_checkmate = True
-        else:
-            opposing_player.escape_moves = { 'drop_moves': drop_moves, 'escape_moves': escape_moves }
-
-
-    def generate_possible_escape_move_strings(self, current_player, escape_moves):
-        drop_moves = escape_moves['drop_moves']
-        list_of_escape_moves = list()
-        for piece_name in current_player.captures:
-            for drop_loc in drop_moves:
-                list_of_escape_moves.append('drop ' + piece_name.lower() + " " + str(drop_loc))
-
-        escape_moves = escape_moves['escape_moves']
-        escape_moves = sorted(escape_moves.items())
-        for start_loc, end_locs in escape_moves:
-            for end_loc in end_locs:
-                list_of_escape_moves.append('move ' + str(start_loc) + " " + str(end_loc))
-
-        return list_of_escape_moves
-
-
-    def find_moves_to_escape_check(self, king, king_loc, current_player, opposing_player, board):
-        escape_moves = dict()
-        dangerous_moves = list()
-        list_of_escape_moves = list()
-
-        next_king_moves = self.find_king_escape_moves(king, king_loc, current_player, board)
-
-        opposing_player_moves = []
-        for piece_name, location in opposing_player.get_pieces().items():
-            opposing_player_moves += piece_util.generate_moves_by_piece(piece_name, location, opposing_player, board, True)
-
-            if piece_name.lower() in ['r', '+r', 'b', '+b'] and len([x for x in next_king_moves if x in opposing_player_moves]) > 0:
-                dangerous_moves += piece_util.generate_attacks_by_piece(piece_name, location, king_loc, current_player, board)
-
-                if self.debug_mode:
-                    print("Moves after generating dangerous moves for " + piece_name + "... " + str(dangerous_moves))
-
-        # void all of the opposing player moves where the player already has pieces
-        opposing_player_moves = [x for x in list(set(opposing_player_moves)) if x not in opposing_player.get_pieces().values()]
-        king_escape_moves = [x for x in next_king_moves if x not in opposing_player_moves]
-        escape_moves[king_loc] = king_escape_moves
 
-        for piece_name, location in current_player.get_pieces().items():
-            # Avoid changing the king's escape positions 
-            if piece_name != king:
-                current_player_moves = piece_util.generate_moves_by_piece(piece_name, location, current_player, board, False)
+        self.position_cache.put(cache_key, (opposing_player.in_check, opposing_player.in_checkmate))
 
-                # Find moves that other pieces other than the king can make to move out of check
-                intersecting_moves = [x for x in dangerous_moves if x in current_player_moves]
-                if len(intersecting_moves) > 0:
-                    escape_moves[location] = intersecting_moves
-        return escape_moves, dangerous_moves
 
+    def generate_possible_escape_move_strings(self, current_player, escape_moves):
+        ''' Returns the sorted list of actions that get the current player out of check
 
-    def find_king_escape_moves(self, king, king_loc, current_player, board):
-        next_king_moves = piece_util.generate_moves_by_piece(king, king_loc, current_player, board, False)
-        next_king_moves = [x for x in next_king_moves if x not in current_player.get_pieces().values()]
-        return next_king_moves
+        A move that can be made with or without a promotion is only listed once.
+        '''
+        list_of_escape_moves = set()
+        for origin, destination, promote, drop_piece in escape_moves:
+            list_of_escape_moves.add(piece_util.convert_move_to_string((origin, destination, False, drop_piece)))
+        return sorted(list_of_escape_moves)
 
 
     def set_game_over_status(self, game_over_reason):
+        self.game_over_reason = game_over_reason
         if game_over_reason is TOO_MANY_MOVES:
             self.is_game_over = True
             self.game_over_message = "Tie game.  Too many moves."
@@ -478,14 +450,47 @@ class Game(object):
             winning_player = self.upper_player if player.map_player_name_to_enum[self.current_player.get_name()] is player.LOWER else self.lower_player
 
             self.is_game_over = True
+            self.winning_player = winning_player
             self.game_over_message = winning_player.get_name() + " player wins.  " + game_over_reason + "."
 
 
+    def check_game_over_status(self):
+        ''' Return type void
+
+        Ends the game if the player to move is in checkmate or the move limit has been
+        reached, which is otherwise only checked before the next move is played.
+        '''
+        if self.is_game_over:
+            return
+        if self.current_player.is_in_checkmate():
+            self.set_game_over_status(CHECKMATE)
+        elif self.num_moves >= game_board.MAX_MOVES:
+            self.set_game_over_status(TOO_MANY_MOVES)
+
+
+    def get_evaluation(self, side=None):
+        ''' Returns the score of the current position in hundredths of a pawn in favor of the player, by default the current player
+
+        The score is kept up to date by the board as pieces are moved, captured and
+        dropped, see GameBoard.Position, so this does not look at the squares.
+        '''
+        if side is None:
+            side = self.current_player.side
+        return self.game_board.get_score(side)
+
+
+    def get_position_string(self):
+        ''' Returns the current position as a one-line position string '''
+        return self.game_board.to_position_string(self.num_moves + 1)
+
+
     def print_last_action(self, game_board, lower_captures, upper_captures, move=None):
         next_player = self.get_opposing_player()
         if move:
             print(next_player.get_name() + " player action: " + move)
-        print(utils.stringifyBoard(game_board))
+        print(utils.stringifyBoard(game_board.to_array()))
         print("Captures UPPER: " + str(" ".join(upper_captures)))
         print("Captures lower: " + str(" ".join(lower_captures)))
+        if self.debug_mode:
+            print("Position: " + self.get_position_string())
         print("")
@@ -1,9 +1,13 @@
-import sys
+import random
 
-import PieceUtils as piece_utils
+import Player as player
 
 NUM_ROWS = 5
 NUM_COLS = 5
+NUM_SQUARES = NUM_ROWS * NUM_COLS
+
+# the game is a draw once this many moves have been made
+MAX_MOVES = 400
 
 map_char_to_num = {
    "a" : 1,
@@ -21,29 +25,429 @@ map_num_to_char = {
    5: "e",
 }
 
+PIECE_NAMES = ['k', 'g', 's', 'b', 'r', 'p', '+s', '+b', '+r', '+p']
+PIECE_NAMES = PIECE_NAMES + [x.upper() for x in PIECE_NAMES]
+
+CAPTURE_PIECE_NAMES = ['g', 's', 'b', 'r', 'p', 'G', 'S', 'B', 'R', 'P']
+MAX_CAPTURES_OF_PIECE = 32
+# each player starts with one of every piece, and pieces only change sides or promote,
+# so there are never more than two of a piece on the board and in the captures together
+MAX_PIECES_OF_KIND = 2
+
+# Squares are numbered 0-24 starting at a1 and moving across the files first,
+# so a1 is 0, e1 is 4, a2 is 5 and e5 is 24.
+SQUARE_TO_LOCATION = [map_num_to_char[(sq % NUM_COLS) + 1] + str((sq // NUM_COLS) + 1) for sq in range(NUM_SQUARES)]
+LOCATION_TO_SQUARE = dict((loc, sq) for sq, loc in enumerate(SQUARE_TO_LOCATION))
+
+SQUARE_BITS = [1 << sq for sq in range(NUM_SQUARES)]
+FULL_BOARD = (1 << NUM_SQUARES) - 1
+FILE_MASKS = [sum(SQUARE_BITS[rank * NUM_COLS + file] for rank in range(NUM_ROWS)) for file in range(NUM_COLS)]
+RANK_MASKS = [sum(SQUARE_BITS[rank * NUM_COLS + file] for file in range(NUM_COLS)) for rank in range(NUM_ROWS)]
+
+
+def build_zobrist_keys(seed=20181):
+    ''' Returns the random 64-bit keys XORed together to make the Zobrist hash of a position
+
+    There is a key for every piece name on every square, a key for every count of
+    every piece name a player can hold in their captures, and a key that is mixed in
+    when the UPPER player is the side to move. The key for holding none of a piece is
+    0 so that empty captures do not change the hash. A fixed seed keeps hashes stable
+    between runs.
+    '''
+    rng = random.Random(seed)
+    piece_keys = dict((piece_name, [rng.getrandbits(64) for sq in range(NUM_SQUARES)]) for piece_name in PIECE_NAMES)
+    capture_keys = dict((piece_name, [0] + [rng.getrandbits(64) for count in range(MAX_CAPTURES_OF_PIECE)])
+                        for piece_name in CAPTURE_PIECE_NAMES)
+    side_key = rng.getrandbits(64)
+    return piece_keys, capture_keys, side_key
+
+
+ZOBRIST_PIECE_KEYS, ZOBRIST_CAPTURE_KEYS, ZOBRIST_SIDE_KEY = build_zobrist_keys()
+
+# values are in hundredths of a pawn; pieces in hand are worth a little more
+# than on the board because they can be dropped almost anywhere
+PIECE_VALUES = { 'k': 0, 'g': 600, 's': 500, 'b': 800, 'r': 1000, 'p': 100,
+                 '+s': 600, '+b': 1100, '+r': 1300, '+p': 600 }
+HAND_VALUES = { 'g': 650, 's': 550, 'b': 900, 'r': 1100, 'p': 150 }
+# bonus for every rank a piece has moved up from its player's first rank
+ADVANCEMENT_VALUES = { 'k': -10, 'g': 3, 's': 5, 'p': 10 }
+
+
+def build_score_tables():
+    ''' Returns the scores of every piece name on every square and of every piece name in the captures
+
+    Scores are in favor of the lower player, so the pieces of the UPPER player count
+    against it. A piece on a square is worth its value plus the advancement bonus for
+    how far it stands from its player's first rank. Promoted pieces have no bonus.
+    '''
+    piece_square_scores = dict()
+    for piece_name in PIECE_NAMES:
+        value = PIECE_VALUES[piece_name.lower()]
+        advancement = ADVANCEMENT_VALUES.get(piece_name.lower(), 0)
+        scores = []
+        for square in range(NUM_SQUARES):
+            rank = square // NUM_COLS
+            if piece_name[-1].islower():
+                scores.append(value + advancement * rank)
+            else:
+                scores.append(-value - advancement * (NUM_ROWS - 1 - rank))
+        piece_square_scores[piece_name] = scores
+    capture_scores = dict((piece_name, HAND_VALUES[piece_name] if piece_name.islower() else -HAND_VALUES[piece_name.lower()])
+                          for piece_name in CAPTURE_PIECE_NAMES)
+    return piece_square_scores, capture_scores
+
+
+PIECE_SQUARE_SCORES, CAPTURE_SCORES = build_score_tables()
+
+
+def convert_location_to_square(location):
+    ''' Returns the 0-24 square index of a board location like 'a1' or None if the location is invalid '''
+    return LOCATION_TO_SQUARE.get(location)
+
+
+def convert_square_to_location(square):
+    ''' Returns the board location like 'a1' of a 0-24 square index '''
+    return SQUARE_TO_LOCATION[square]
+
+
+def get_side_of_piece(piece_name):
+    ''' Returns the player enum that owns a piece based on the case of its name '''
+    return player.UPPER if piece_name[-1].isupper() else player.LOWER
+
+
+def iterate_squares(mask):
+    ''' Yields the square index of every bit set in a bitboard, lowest square first '''
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+# one-line position strings: the board from rank 5 down to rank 1 with the files from
+# a to e, the side to move, the pieces in hand and the move number, e.g. the start is
+# 'RBSGK/4P/5/p4/kgsbr l - 1'
+POSITION_SIDE_NAMES = ['l', 'U']
+POSITION_HAND_ORDER = ['r', 'b', 'g', 's', 'p']
+
+
+def parse_position_string(position_string):
+    ''' Returns a tuple of (Position, move number) read from a one-line position string or None if it is invalid
+
+    Empty squares in a rank are given as a count and ranks are separated by '/'. The
+    pieces in hand are written with a count in front of any piece held more than once,
+    like '2pG', or '-' when neither player holds any. The move number starts at 1 and
+    counts the moves of both players. A position with more of a piece than the game has,
+    on the board and in the captures together, is invalid.
+    '''
+    fields = position_string.split()
+    if len(fields) != 4 or fields[1] not in POSITION_SIDE_NAMES or not fields[3].isdigit() or int(fields[3]) < 1:
+        return None
+    board_field, side_field, hand_field, move_number_field = fields
+
+    position = Position()
+    rank = NUM_ROWS - 1
+    file = 0
+    promoted = False
+    for char in board_field:
+        if char == '/':
+            if file != NUM_COLS or promoted or rank == 0:
+                return None
+            rank -= 1
+            file = 0
+        elif char == '+':
+            promoted = True
+        elif char.isdigit():
+            file += int(char)
+            if promoted or file > NUM_COLS:
+                return None
+        else:
+            piece_name = '+' + char if promoted else char
+            if file >= NUM_COLS or piece_name not in PIECE_NAMES:
+                return None
+            position.place_piece(piece_name, rank * NUM_COLS + file)
+            file += 1
+            promoted = False
+    if rank != 0 or file != NUM_COLS or promoted:
+        return None
+
+    captures = [[], []]
+    if hand_field != '-':
+        count = 0
+        for char in hand_field:
+            if char.isdigit():
+                count = count * 10 + int(char)
+            elif char in CAPTURE_PIECE_NAMES and count <= MAX_PIECES_OF_KIND:
+                captures[get_side_of_piece(char)].extend([char] * (count or 1))
+                count = 0
+            else:
+                return None
+        if count:
+            return None
+
+    if position.squares.count('k') > 1 or position.squares.count('K') > 1:
+        return None
+    pieces = [x[-1].lower() for x in position.squares + captures[player.LOWER] + captures[player.UPPER] if x]
+    if any(pieces.count(x) > MAX_PIECES_OF_KIND for x in set(pieces) if x != 'k'):
+        return None
+    position.set_captures(captures[player.LOWER], captures[player.UPPER])
+    position.set_side_to_move(POSITION_SIDE_NAMES.index(side_field))
+    # the player who just moved can't have left its king in check, or the king could be captured.
+    # PieceUtils imports this module, so it is only imported once it is needed
+    import PieceUtils as piece_util
+    if piece_util.is_in_check(position, 1 - position.side_to_move):
+        return None
+    return position, int(move_number_field)
+
+
+class Position(object):
+    ''' Bitboard representation of the pieces on the game board
+
+    Every piece name (e.g. 'k', '+s', 'R') has a 25-bit integer where bit n is set
+    if that piece stands on square n. The occupancy masks hold the union of every
+    piece owned by each player, indexed by the player enum. A flat list of piece
+    names per square is kept alongside the bitboards so that looking up which piece
+    is on a square does not require scanning every bitboard.
+
+    The position also tracks the captures of both players, the side to move and
+    a Zobrist hash of all three plus the board. The hash is updated incrementally
+    whenever a piece is placed, removed, captured or dropped.
+
+    The score is the evaluation of the position in favor of the lower player: the
+    material on the board and in the captures plus the advancement bonuses, see
+    build_score_tables. Like the hash, it is only ever changed by the piece that is
+    placed, removed, captured or dropped, so it is never recomputed from the squares.
+    '''
+    def __init__(self):
+        self.squares = [''] * NUM_SQUARES
+        self.bitboards = dict((piece_name, 0) for piece_name in PIECE_NAMES)
+        self.occupancy = [0, 0]
+        self.captures = [[], []]
+        self.side_to_move = player.LOWER
+        self.hash = 0
+        self.score = 0
+        self.undo_stack = []
+
+    def set_captures(self, lower_captures, upper_captures):
+        ''' Shares the players' capture lists with the position so drops and captures update them '''
+        self.hash ^= self.compute_captures_hash()
+        self.score -= self.compute_captures_score()
+        self.captures = [lower_captures, upper_captures]
+        self.hash ^= self.compute_captures_hash()
+        self.score += self.compute_captures_score()
+
+    def set_side_to_move(self, side):
+        if side != self.side_to_move:
+            self.side_to_move = side
+            self.hash ^= ZOBRIST_SIDE_KEY
+
+    def compute_captures_hash(self):
+        captures_hash = 0
+        for captures in self.captures:
+            for piece_name in set(captures):
+                captures_hash ^= ZOBRIST_CAPTURE_KEYS[piece_name][captures.count(piece_name)]
+        return captures_hash
+
+    def compute_hash(self):
+        ''' Returns the Zobrist hash of the position computed from scratch instead of incrementally '''
+        position_hash = self.compute_captures_hash()
+        for square, piece_name in enumerate(self.squares):
+            if piece_name:
+                position_hash ^= ZOBRIST_PIECE_KEYS[piece_name][square]
+        if self.side_to_move is player.UPPER:
+            position_hash ^= ZOBRIST_SIDE_KEY
+        return position_hash
+
+    def compute_captures_score(self):
+        return sum(CAPTURE_SCORES[piece_name] for captures in self.captures for piece_name in captures)
+
+    def compute_score(self):
+        ''' Returns the score of the position computed from scratch instead of incrementally '''
+        score = self.compute_captures_score()
+        for square, piece_name in enumerate(self.squares):
+            if piece_name:
+                score += PIECE_SQUARE_SCORES[piece_name][square]
+        return score
+
+    def get_score(self, side):
+        ''' Returns the score of the position in favor of the player '''
+        return self.score if side is player.LOWER else -self.score
+
+    def get_piece(self, square):
+        return self.squares[square]
+
+    def get_occupied(self):
+        return self.occupancy[player.LOWER] | self.occupancy[player.UPPER]
+
+    def is_empty(self, square):
+        return not self.get_occupied() & SQUARE_BITS[square]
+
+    def is_owned_by(self, square, side):
+        return self.occupancy[side] & SQUARE_BITS[square] != 0
+
+    def place_piece(self, piece_name, square):
+        bit = SQUARE_BITS[square]
+        self.squares[square] = piece_name
+        self.bitboards[piece_name] |= bit
+        self.occupancy[get_side_of_piece(piece_name)] |= bit
+        self.hash ^= ZOBRIST_PIECE_KEYS[piece_name][square]
+        self.score += PIECE_SQUARE_SCORES[piece_name][square]
+
+    def remove_piece(self, square):
+        ''' Returns the name of the piece removed from the square or '' if it was empty '''
+        piece_name = self.squares[square]
+        if piece_name:
+            bit = SQUARE_BITS[square]
+            self.squares[square] = ''
+            self.bitboards[piece_name] &= ~bit
+            self.occupancy[get_side_of_piece(piece_name)] &= ~bit
+            self.hash ^= ZOBRIST_PIECE_KEYS[piece_name][square]
+            self.score -= PIECE_SQUARE_SCORES[piece_name][square]
+        return piece_name
+
+    def find_piece(self, piece_name):
+        ''' Returns the lowest square holding the piece or None if it is not on the board '''
+        mask = self.bitboards[piece_name]
+        if not mask:
+            return None
+        return (mask & -mask).bit_length() - 1
+
+    def iterate_pieces(self, side):
+        ''' Yields (square, piece_name) for every piece the player has on the board '''
+        for square in iterate_squares(self.occupancy[side]):
+            yield square, self.squares[square]
+
+    def make_move(self, move):
+        ''' Applies a move to the position and pushes a record onto the undo stack
+
+        A move is a tuple of (origin, destination, promote, drop_piece). Origin is
+        None for drops, in which case drop_piece is the name of the piece in the
+        player's captures (e.g. 'p' or 'P'). Any piece on the destination square is
+        captured and added, unpromoted, to the captures of the moving player.
+        The move is not validated, so callers must only pass moves that are legal
+        to make in the current position. The side to move is passed to the other
+        player.
+        '''
+        origin, destination, promote, drop_piece = move
+        previous_hash = self.hash
+
+        if origin is None:
+            captures = self.captures[get_side_of_piece(drop_piece)]
+            capture_keys = ZOBRIST_CAPTURE_KEYS[drop_piece]
+            count = captures.count(drop_piece)
+            capture_idx = captures.index(drop_piece)
+            del captures[capture_idx]
+            self.hash ^= capture_keys[count] ^ capture_keys[count - 1]
+            self.score -= CAPTURE_SCORES[drop_piece]
+            self.place_piece(drop_piece, destination)
+            self.undo_stack.append((move, drop_piece, '', capture_idx, previous_hash))
+        else:
+            moved_piece = self.remove_piece(origin)
+            captured_piece = self.remove_piece(destination)
+            side = get_side_of_piece(moved_piece)
+
+            if captured_piece:
+                hand_piece = captured_piece[-1]
+                hand_piece = hand_piece.upper() if side is player.UPPER else hand_piece.lower()
+                capture_keys = ZOBRIST_CAPTURE_KEYS[hand_piece]
+                count = self.captures[side].count(hand_piece)
+                self.captures[side].append(hand_piece)
+                self.hash ^= capture_keys[count] ^ capture_keys[count + 1]
+                self.score += CAPTURE_SCORES[hand_piece]
+
+            self.place_piece('+' + moved_piece if promote else moved_piece, destination)
+            self.undo_stack.append((move, moved_piece, captured_piece, None, previous_hash))
+
+        self.side_to_move = player.UPPER if self.side_to_move is player.LOWER else player.LOWER
+        self.hash ^= ZOBRIST_SIDE_KEY
+
+    def unmake_move(self):
+        ''' Reverts the last move applied with make_move and returns that move '''
+        move, moved_piece, captured_piece, capture_idx, previous_hash = self.undo_stack.pop()
+        origin, destination, promote, drop_piece = move
+
+        self.remove_piece(destination)
+
+        if origin is None:
+            self.captures[get_side_of_piece(drop_piece)].insert(capture_idx, drop_piece)
+            self.score += CAPTURE_SCORES[drop_piece]
+        else:
+            if captured_piece:
+                self.score -= CAPTURE_SCORES[self.captures[get_side_of_piece(moved_piece)].pop()]
+                self.place_piece(captured_piece, destination)
+            self.place_piece(moved_piece, origin)
+
+        self.side_to_move = player.UPPER if self.side_to_move is player.LOWER else player.LOWER
+        self.hash = previous_hash
+        return move
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.squares = list(self.squares)
+        position.bitboards = dict(self.bitboards)
+        position.occupancy = list(self.occupancy)
+        position.captures = [list(self.captures[player.LOWER]), list(self.captures[player.UPPER])]
+        position.side_to_move = self.side_to_move
+        position.hash = self.hash
+        position.score = self.score
+        position.undo_stack = list(self.undo_stack)
+        return position
+
+    def to_position_string(self, move_number=1):
+        ''' Returns the position as a one-line position string, see parse_position_string '''
+        ranks = []
+        for rank in range(NUM_ROWS - 1, -1, -1):
+            rank_string = ''
+            num_empty = 0
+            for piece_name in self.squares[rank * NUM_COLS:(rank + 1) * NUM_COLS]:
+                if not piece_name:
+                    num_empty += 1
+                    continue
+                if num_empty:
+                    rank_string += str(num_empty)
+                    num_empty = 0
+                rank_string += piece_name
+            ranks.append(rank_string + str(num_empty) if num_empty else rank_string)
+
+        hand_string = ''
+        for side in [player.UPPER, player.LOWER]:
+            for piece in POSITION_HAND_ORDER:
+                piece_name = piece.upper() if side is player.UPPER else piece
+                count = self.captures[side].count(piece_name)
+                if count:
+                    hand_string += str(count) + piece_name if count > 1 else piece_name
+
+        return '/'.join(ranks) + ' ' + POSITION_SIDE_NAMES[self.side_to_move] + ' ' + (hand_string or '-') + ' ' + str(move_number)
+
+    def to_array(self):
+        ''' Returns the position as the 2D-array of piece strings indexed by [file][rank] '''
+        return [[self.squares[rank * NUM_COLS + file] for rank in range(NUM_ROWS)] for file in range(NUM_COLS)]
+
+    @staticmethod
+    def from_array(board):
+        ''' Returns a Position built from a 2D-array of piece strings indexed by [file][rank] '''
+        position = Position()
+        for file in range(NUM_COLS):
+            for rank in range(NUM_ROWS):
+                if board[file][rank] != '':
+                    position.place_piece(board[file][rank], rank * NUM_COLS + file)
+        return position
+
 
 class GameBoard(object):
-    def __init__(self, defaultConfiguation=True, listOfPiecesAndLocations=None):
+    def __init__(self, defaultConfiguation=True, listOfPiecesAndLocations=None, position=None):
         ''' Initializes the game board based on the initial configuration
 
             The listOfPiecesAndLocations is a list that contains tuples representing a piece
-            and a board location. Example: [(p, a4), (S, b3)]
+            and a board location. Example: [(p, a4), (S, b3)]. If a Position is given instead,
+            e.g. one read from a position string, the game board starts from it.
         '''
-        self.lower_pieces = None
-        self.upper_pieces = None
-        self.board = self.initialize_board(defaultConfiguation, listOfPiecesAndLocations)
-
-    def set_lower_pieces(self, arr):
-      self.lower_pieces = arr
+        if position is not None:
+            self.board = position
+        else:
+            self.board = self.initialize_board(defaultConfiguation, listOfPiecesAndLocations)
 
-    def set_upper_pieces(self, arr):
-      self.upper_pieces = arr
-    
     def initialize_board(self, defaultConfiguation, listOfPiecesAndLocations):
-        lower_pieces = dict()
-        upper_pieces = dict()
-
-        board = [['' for i in range(NUM_COLS)] for j in range(NUM_ROWS)]
+        position = Position()
 
         if not defaultConfiguation and listOfPiecesAndLocations:
 
@@ -51,50 +455,20 @@ class GameBoard(object):
                 piece_name = initial_pieces['piece']
                 loc = initial_pieces['position']
 
-                col = piece_utils.convert_board_pos_to_index(loc[1])
-                row = piece_utils.convert_board_pos_to_index(map_char_to_num[loc[0]])
-
-                if (col >= 0 and col < NUM_COLS and
-                    row >= 0 and row < NUM_ROWS):
-
-                    piece_name_value = ord(piece_name) if len(piece_name) == 1 else ord(piece_name[1:])
-                    if piece_name_value > 64 and piece_name_value < 91:
-                      upper_pieces[piece_name] = loc
-
-                    elif piece_name_value > 96 and piece_name_value < 123:
-                      lower_pieces[piece_name] = loc
+                square = convert_location_to_square(loc)
 
-                    board[row][col] = piece_name
+                if square is not None and piece_name in position.bitboards:
+                    position.place_piece(piece_name, square)
                 else:
                     print("Piece " + str(piece_name) + " not inserted because of invalid "
-                        " board location: (" + str(col) + ", " + str(row) + ")")
-                    
+                        " board location: " + str(loc))
+
         else:
             if not defaultConfiguation and not listOfPiecesAndLocations:
                 print("Invalid board configuation... initializing game with default board configuation.")
 
-            board[0][0] = 'k'
-            board[1][0] = 'g'
-            board[2][0] = 's'
-            board[3][0] = 'b'
-            board[4][0] = 'r'
-            board[0][1] = 'p'
-
-            board[0][4] = 'K'
-            board[1][4] = 'G'
-            board[2][4] = 'S'
-            board[3][4] = 'B'
-            board[4][4] = 'R'
-            board[4][3] = 'P'
-
-            upper_pieces = { 'K': 'a5', 'G': 'b5', 'S': 'c5', 'B': 'd5', 'R': 'e5', 'P': 'e4' }
-            lower_pieces = { 'k': 'a1', 'g': 'b1', 's': 'c1', 'b': 'd1', 'r': 'e1', 'p': 'a2' }
-
-        self.set_lower_pieces(lower_pieces)
-        self.set_upper_pieces(upper_pieces)
-
-        return board
+            for piece_name, loc in [('k', 'a1'), ('g', 'b1'), ('s', 'c1'), ('b', 'd1'), ('r', 'e1'), ('p', 'a2'),
+                                    ('K', 'e5'), ('G', 'd5'), ('S', 'c5'), ('B', 'b5'), ('R', 'a5'), ('P', 'e4')]:
+                position.place_piece(piece_name, convert_location_to_square(loc))
 
-    def clear_player_pieces(self):
-        self.lower_pieces = None
-        self.upper_pieces = None
+        return position
@@ -0,0 +1,187 @@
+import array
+import os
+import struct
+import sys
+import time
+
+import Batch as batch
+import Game as game
+import GameBoard as game_board
+import Player as player
+import Utils as utils
+
+RECORD_MAGIC = b'MSGR'
+RECORD_VERSION = 1
+FILE_HEADER_FORMAT = '<4sH'
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FORMAT)
+# end of the game, winner, number of moves and length of the position string
+GAME_HEADER_FORMAT = '<BBHB'
+GAME_HEADER_SIZE = struct.calcsize(GAME_HEADER_FORMAT)
+
+# the end of a game is 0 if it isn't over or 1 plus its index in Game.END_GAME, and
+# the winner is 0 if there is none or 1 plus the player enum of the winner
+[NOT_OVER, NO_WINNER] = [0, 0]
+
+# a move code is the destination square in bits 0-4, the origin square in bits 5-9,
+# the promotion flag in bit 10 and the dropped piece in bits 11-13, where 0 means
+# the move isn't a drop
+DROP_PIECES = ['', 'g', 's', 'b', 'r', 'p']
+[SQUARE_BITS, SQUARE_MASK] = [5, 0x1F]
+[PROMOTE_SHIFT, DROP_SHIFT] = [10, 11]
+
+
+def encode_move(move):
+    ''' Returns the 16-bit code of a (origin, destination, promote, drop_piece) move tuple '''
+    origin, destination, promote, drop_piece = move
+    if origin is None:
+        return DROP_PIECES.index(drop_piece.lower()) << DROP_SHIFT | destination
+    return origin << SQUARE_BITS | destination | (promote << PROMOTE_SHIFT)
+
+
+def decode_move(code, side):
+    ''' Returns the move tuple of a 16-bit move code played by the given side '''
+    drop_piece = DROP_PIECES[code >> DROP_SHIFT]
+    if drop_piece:
+        return None, code & SQUARE_MASK, False, drop_piece.upper() if side is player.UPPER else drop_piece
+    return code >> SQUARE_BITS & SQUARE_MASK, code & SQUARE_MASK, bool(code >> PROMOTE_SHIFT & 1), None
+
+
+class GameRecordWriter(object):
+    ''' Writes games one after another to a binary game record file
+
+    The file starts with a short header, and every game is a header with how the game
+    ended and its length, the starting position as a one-line position string and then
+    one 16-bit code per move.
+    '''
+    def __init__(self, filename):
+        self.record_file = open(filename, 'wb')
+        self.record_file.write(struct.pack(FILE_HEADER_FORMAT, RECORD_MAGIC, RECORD_VERSION))
+        self.num_games = 0
+
+    def write_game(self, position_string, moves, end=NOT_OVER, winner=NO_WINNER):
+        self.write_move_codes(position_string, array.array('H', [encode_move(x) for x in moves]), end, winner)
+
+    def write_move_codes(self, position_string, move_codes, end=NOT_OVER, winner=NO_WINNER):
+        ''' Writes a game whose moves are already 16-bit move codes, e.g. a game read with read_game_records '''
+        move_codes = array.array('H', move_codes)
+        if sys.byteorder != 'little':
+            move_codes.byteswap()
+        position_bytes = position_string.encode('ascii')
+        self.record_file.write(struct.pack(GAME_HEADER_FORMAT, end, winner, len(move_codes), len(position_bytes)))
+        self.record_file.write(position_bytes)
+        self.record_file.write(move_codes.tobytes())
+        self.num_games += 1
+
+    def close(self):
+        self.record_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_game_records(filename):
+    ''' Yields a dict() for every game in a binary game record file, one game at a time
+
+    Dict contains the following:
+
+    position: the one-line position string the game started from
+    end: 0 if the game isn't over or 1 plus the index of the reason in Game.END_GAME
+    winner: 0 if there is no winner or 1 plus the player enum of the winner
+    moves: array of 16-bit move codes, see decode_move
+    '''
+    with open(filename, 'rb') as record_file:
+        file_header = record_file.read(FILE_HEADER_SIZE)
+        if len(file_header) != FILE_HEADER_SIZE or struct.unpack(FILE_HEADER_FORMAT, file_header) != (RECORD_MAGIC, RECORD_VERSION):
+            print("The game record file " + str(filename) + " is not a valid game record. Exiting...")
+            sys.exit()
+
+        while True:
+            game_header = record_file.read(GAME_HEADER_SIZE)
+            if not game_header:
+                return
+            end, winner, num_moves, position_length = struct.unpack(GAME_HEADER_FORMAT, game_header)
+            position_string = record_file.read(position_length).decode('ascii')
+            move_codes = array.array('H')
+            move_codes.frombytes(record_file.read(num_moves * 2))
+            if sys.byteorder != 'little':
+                move_codes.byteswap()
+            yield dict(position=position_string, end=end, winner=winner, moves=move_codes)
+
+
+def replay_game_record(game_record):
+    ''' Returns the Position reached after making every move of a game read from a game record
+
+    The moves were legal when the game was recorded, so they are made without checking them again.
+    '''
+    position, move_number = game_board.parse_position_string(game_record['position'])
+    for code in game_record['moves']:
+        position.make_move(decode_move(code, position.side_to_move))
+    return position
+
+
+def convert_test_case(test_case, writer):
+    ''' Return type void
+
+    Plays the moves of a game read from a game file and writes the game to the record
+    writer. The game is recorded up to the last move that was made, so an illegal move
+    at the end of a game is left out but the result still says who won because of it.
+    '''
+    game_instance = game.Game('f', test_case=test_case)
+    position_string = game_instance.get_position_string()
+    game_instance.replay()
+    game_instance.check_game_over_status()
+
+    end = NOT_OVER
+    winner = NO_WINNER
+    if game_instance.is_game_over:
+        end = game.END_GAME.index(game_instance.game_over_reason) + 1
+        if game_instance.winning_player is not None:
+            winner = game_instance.winning_player.get_side() + 1
+    moves = [x[0] for x in game_instance.game_board.undo_stack]
+    writer.write_game(position_string, moves, end, winner)
+
+
+def convert_game_files(path, record_filename):
+    ''' Return type void
+
+    Converts every game in the .in files in a directory or matching a glob pattern into
+    one binary game record file and prints how much smaller it is than the text files.
+    A file can hold many games, as read by utils.iterateTestCases.
+    '''
+    filenames = batch.find_game_files(path)
+    text_size = 0
+    with GameRecordWriter(record_filename) as writer:
+        for filename in filenames:
+            for test_case in utils.iterateTestCases(filename):
+                convert_test_case(test_case, writer)
+            text_size += os.path.getsize(filename)
+        num_games = writer.num_games
+        record_size = writer.record_file.tell()
+
+    print("Games: " + str(num_games))
+    print("Text size: " + str(text_size) + " bytes")
+    print("Record size: " + str(record_size) + " bytes")
+
+
+def run_game_records(record_filename):
+    ''' Return type void
+
+    Replays every game in a binary game record file and prints the number of games and
+    moves replayed, the time taken and the number of moves per second.
+    '''
+    start_time = time.time()
+    num_games = 0
+    num_moves = 0
+    for game_record in read_game_records(record_filename):
+        replay_game_record(game_record)
+        num_games += 1
+        num_moves += len(game_record['moves'])
+    elapsed_time = time.time() - start_time
+
+    print("Games: " + str(num_games))
+    print("Moves: " + str(num_moves))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Moves/second: " + str(int(num_moves / elapsed_time) if elapsed_time > 0 else num_moves))
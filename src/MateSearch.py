@@ -0,0 +1,213 @@
+import time
+
+import GameBoard as game_board
+import PieceUtils as piece_util
+import Player as player
+import TranspositionCache as transposition_cache
+
+# proof and disproof numbers are capped here, and a number this large means the node is solved
+INFINITE = 1 << 30
+DEFAULT_TABLE_ENTRIES = 1 << 20
+
+
+class MateSearch(object):
+    ''' Proves or disproves a forced mate within a number of moves with df-pn (depth-first proof-number search)
+
+    The attacker is the side to move at the root and only plays moves that give check.
+    The defender plays every legal move, which in check are the escapes: king moves,
+    captures of the checking piece and interpositions by moves or drops. A defender with
+    no legal move is checkmated, and since generate_legal_moves never makes a pawn drop
+    that gives checkmate, neither does the attacker. An attacker with no checks or no
+    moves left has failed.
+
+    Every node has a proof number, the least number of nodes under it that still have to
+    be proven to prove the mate, and a disproof number, the same for disproving it. They
+    are kept as phi and delta from the point of view of the player to move, so the same
+    code handles both players: phi of a node is the least delta of its children and delta
+    is the sum of their phis. df-pn always descends into the child with the least delta,
+    and only returns to the parent once the numbers of a node pass the thresholds it was
+    given, so it goes depth first without giving up the best-first order of proof-number
+    search.
+
+    The numbers are stored in a TranspositionCache keyed on the Zobrist hash of the
+    position and the number of attacker moves left, so the table stays within its number
+    of entries and evicts the least recently used ones. A node that was evicted starts
+    again from proof and disproof numbers of 1.
+    '''
+    def __init__(self, board, max_entries=DEFAULT_TABLE_ENTRIES):
+        self.board = board
+        self.table = transposition_cache.TranspositionCache(max_entries)
+        self.nodes = 0
+
+    def generate_moves(self, attacking):
+        ''' Returns a list of (move, hash after the move) for every check of the attacker or every legal move of the defender
+
+        The list is kept in the table too, so a position that is searched again, e.g. by
+        the next iteration of find_mate_length, doesn't have to generate its moves again.
+        '''
+        board = self.board
+        key = ('moves', board.hash)
+        moves = self.table.get(key)
+        if moves is not None:
+            return moves
+
+        moves = []
+        for move in piece_util.generate_legal_moves(board):
+            board.make_move(move)
+            if not attacking or piece_util.is_in_check(board, board.side_to_move):
+                moves.append((move, board.hash))
+            board.unmake_move()
+        self.table.put(key, moves)
+        return moves
+
+    def mid(self, moves_left, attacking, phi_threshold, delta_threshold):
+        ''' Returns (phi, delta) of the position once either passes its threshold, after storing them in the table
+
+        moves_left is the number of moves the attacker still has, counting the move it is
+        about to make if it is the attacker's turn.
+        '''
+        self.nodes += 1
+        board = self.board
+        key = ('mate', board.hash, moves_left)
+        numbers = self.table.get(key)
+        if numbers is not None and (numbers[0] >= phi_threshold or numbers[1] >= delta_threshold):
+            return numbers
+
+        moves = self.generate_moves(attacking) if moves_left or not attacking else []
+        # a player who has no move here has lost, whether it is the attacker or the defender
+        if not moves:
+            self.table.put(key, (INFINITE, 0))
+            return INFINITE, 0
+
+        # the numbers of the children are kept here while the node is searched, so a child
+        # evicted from the table by its own descendants doesn't start again from 1
+        child_moves_left = moves_left - 1 if attacking else moves_left
+        child_numbers = []
+        for move, child_hash in moves:
+            numbers = self.table.get(('mate', child_hash, child_moves_left))
+            child_numbers.append(numbers if numbers is not None else (1, 1))
+
+        while True:
+            phi = INFINITE
+            delta = 0
+            second_delta = INFINITE
+            best_index = 0
+            for index, (child_phi, child_delta) in enumerate(child_numbers):
+                delta = min(delta + child_phi, INFINITE)
+                if child_delta < phi:
+                    second_delta = phi
+                    phi = child_delta
+                    best_index = index
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+
+            if phi >= phi_threshold or delta >= delta_threshold:
+                self.table.put(key, (phi, delta))
+                return phi, delta
+
+            best_phi = child_numbers[best_index][0]
+            board.make_move(moves[best_index][0])
+            child_numbers[best_index] = self.mid(child_moves_left, not attacking,
+                                                 min(delta_threshold - delta + best_phi, INFINITE),
+                                                 min(phi_threshold, second_delta + 1))
+            board.unmake_move()
+
+    def prove(self, moves_left, attacking=True):
+        ''' Returns a boolean regarding whether the attacker mates within moves_left moves from the current position '''
+        phi, delta = self.mid(moves_left, attacking, INFINITE, INFINITE)
+        return phi == 0 if attacking else delta == 0
+
+    def find_mate_length(self, max_moves):
+        ''' Returns the least number of moves the attacker to move needs to mate, or None if it takes more than max_moves
+
+        The mate is looked for with all max_moves moves first, since there is no shorter mate
+        either if that is disproven. Only when it is proven are the shorter lengths tried.
+        '''
+        if max_moves < 1 or not self.prove(max_moves):
+            return None
+        for moves_left in range(1, max_moves):
+            if self.prove(moves_left):
+                return moves_left
+        return max_moves
+
+    def get_mating_line(self, mate_length):
+        ''' Returns the list of move tuples of a shortest mate, where the defender always delays the mate the longest
+
+        The attacker is to move and must mate in mate_length moves. The board is unchanged
+        when the function returns.
+        '''
+        board = self.board
+        line = []
+        moves_left = mate_length
+        while True:
+            # the attacker plays a check after which the mate still takes the fewest moves
+            for move, child_hash in self.generate_moves(True):
+                board.make_move(move)
+                if self.prove(moves_left - 1, False):
+                    break
+                board.unmake_move()
+            line.append(move)
+            moves_left -= 1
+
+            escapes = piece_util.generate_legal_moves(board)
+            if not escapes:
+                break
+            # the defender plays the escape that puts the mate off the longest
+            max_moves_left = moves_left
+            best_escape = None
+            for escape in escapes:
+                board.make_move(escape)
+                escape_mate_length = self.find_mate_length(max_moves_left)
+                board.unmake_move()
+                if best_escape is None or escape_mate_length > moves_left:
+                    best_escape = escape
+                    moves_left = escape_mate_length
+            board.make_move(best_escape)
+            line.append(best_escape)
+
+        for _ in line:
+            board.unmake_move()
+        return line
+
+
+def find_mate(board, max_moves, moves_played=0, max_entries=DEFAULT_TABLE_ENTRIES):
+    ''' Returns a dict() with the result of looking for a forced mate within max_moves moves for the side to move
+
+    Dict contains the following:
+
+    mate_length: the least number of moves the side to move needs to mate, or None if there is no mate within max_moves
+    line: list of move tuples of the mating line, empty if there is no mate
+    nodes: the number of nodes searched, including the ones searched to find the line
+    max_moves: the number of moves that was searched, which is less than asked for if the move limit comes first
+    '''
+    # the attacker's last move has to be played before the game is drawn by the move limit
+    max_moves = max(0, min(max_moves, (game_board.MAX_MOVES - moves_played + 1) // 2))
+    mate_search = MateSearch(board, max_entries)
+    mate_length = mate_search.find_mate_length(max_moves)
+    line = mate_search.get_mating_line(mate_length) if mate_length is not None else []
+    return dict(mate_length=mate_length, line=line, nodes=mate_search.nodes, max_moves=max_moves)
+
+
+def run_mate(board, max_moves, moves_played=0):
+    ''' Return type void
+
+    Prints the mating line of the side to move, one ply a line, or that there is no mate
+    within max_moves moves, followed by the number of nodes, the time taken and the
+    number of nodes per second.
+    '''
+    start_time = time.time()
+    result = find_mate(board, max_moves, moves_played)
+    elapsed_time = time.time() - start_time
+
+    if result['mate_length'] is None:
+        print("No mate in " + str(result['max_moves']))
+    else:
+        print("Mate in " + str(result['mate_length']))
+        side = board.side_to_move
+        for move in result['line']:
+            print(player.map_player_enum_to_name[side] + " player action: " + piece_util.convert_move_to_string(move))
+            side = 1 - side
+    print("")
+    print("Nodes: " + str(result['nodes']))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Nodes/second: " + str(int(result['nodes'] / elapsed_time) if elapsed_time > 0 else result['nodes']))
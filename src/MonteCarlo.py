@@ -0,0 +1,184 @@
+import math
+import multiprocessing
+import random
+import time
+
+import GameBoard as game_board
+import PieceUtils as piece_util
+
+EXPLORATION = 1.4
+DEFAULT_PLAYOUTS = 1000
+PLAYOUT_CAPTURE_CHANCE = 0.5
+
+
+class Node(object):
+    ''' A position in the search tree, reached by playing move from the parent position
+
+    Wins are counted for the side that played the move, so a parent picks the child
+    that is best for the player choosing between them. A draw counts as half a win.
+    '''
+    __slots__ = ['move', 'side', 'parent', 'children', 'untried_moves', 'visits', 'wins']
+
+    def __init__(self, move, side, parent, untried_moves):
+        self.move = move
+        self.side = side
+        self.parent = parent
+        self.children = []
+        self.untried_moves = untried_moves
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self):
+        ''' Returns the child with the highest upper confidence bound (UCT) '''
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda x: x.wins / x.visits + EXPLORATION * math.sqrt(log_visits / x.visits))
+
+
+class MonteCarloTreeSearch(object):
+    ''' Monte Carlo tree search with UCT selection and random playouts
+
+    Every playout walks down the tree, adds one new position to it and then plays
+    random moves until a player is checkmated or the game reaches the move limit,
+    which counts as a draw. Captures are preferred in the playouts so that the
+    games look a little more like real ones. All of the moves are made and unmade
+    on the one position that is searched, so no boards are copied.
+    '''
+    def __init__(self, board, moves_played=0, seed=None):
+        self.board = board
+        self.moves_left = game_board.MAX_MOVES - moves_played
+        self.random = random.Random(seed)
+        self.root = Node(None, 1 - board.side_to_move, None, piece_util.generate_legal_moves(board))
+        self.playouts = 0
+
+    def choose_playout_move(self, moves):
+        board = self.board
+        if self.random.random() < PLAYOUT_CAPTURE_CHANCE:
+            captures = [x for x in moves if x[0] is not None and board.squares[x[1]]]
+            if captures:
+                return self.random.choice(captures)
+        return self.random.choice(moves)
+
+    def play_out(self, num_moves):
+        ''' Returns the side that wins a random game from the position, or None for a draw '''
+        board = self.board
+        winner = None
+        num_playout_moves = 0
+        while num_moves + num_playout_moves < self.moves_left:
+            moves = piece_util.generate_legal_moves(board)
+            if not moves:
+                winner = 1 - board.side_to_move
+                break
+            board.make_move(self.choose_playout_move(moves))
+            num_playout_moves += 1
+
+        for _ in range(num_playout_moves):
+            board.unmake_move()
+        return winner
+
+    def run_playout(self):
+        board = self.board
+        node = self.root
+        num_moves = 0
+
+        while not node.untried_moves and node.children:
+            node = node.select_child()
+            board.make_move(node.move)
+            num_moves += 1
+
+        if node.untried_moves and num_moves < self.moves_left:
+            move = node.untried_moves.pop(self.random.randrange(len(node.untried_moves)))
+            side = board.side_to_move
+            board.make_move(move)
+            num_moves += 1
+            child = Node(move, side, node, piece_util.generate_legal_moves(board))
+            node.children.append(child)
+            node = child
+
+        winner = self.play_out(num_moves)
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.side:
+                node.wins += 1
+            node = node.parent
+
+        for _ in range(num_moves):
+            board.unmake_move()
+        self.playouts += 1
+
+    def run(self, max_playouts=DEFAULT_PLAYOUTS, time_ms=None):
+        ''' Returns a dict of root move to (visits, wins) after running out of playouts or time '''
+        deadline = time.time() + time_ms / 1000.0 if time_ms is not None else None
+        # one playout is always run, so that the root has a move to choose however small the budget is
+        self.run_playout()
+        while max_playouts is None or self.playouts < max_playouts:
+            if deadline is not None and time.time() >= deadline:
+                break
+            self.run_playout()
+        return self.get_root_stats()
+
+    def get_root_stats(self):
+        return dict((x.move, (x.visits, x.wins)) for x in self.root.children)
+
+
+def run_tree(arguments):
+    ''' Returns a tuple of (root stats, playouts) for one independently seeded tree '''
+    board, moves_played, max_playouts, time_ms, seed = arguments
+    tree = MonteCarloTreeSearch(board, moves_played, seed)
+    return tree.run(max_playouts, time_ms), tree.playouts
+
+
+def merge_root_stats(results):
+    ''' Returns the visits and wins of every root move summed over all of the trees '''
+    root_stats = dict()
+    for tree_stats, _ in results:
+        for move, (visits, wins) in tree_stats.items():
+            total_visits, total_wins = root_stats.get(move, (0, 0.0))
+            root_stats[move] = (total_visits + visits, total_wins + wins)
+    return root_stats
+
+
+def best_move(position, moves_played=0, max_playouts=DEFAULT_PLAYOUTS, time_ms=None, num_workers=1, seed=None, report=False):
+    ''' Returns the most visited move tuple for the side to move, or None if there are no legal moves
+
+    moves_played is the number of moves already made in the game, so that playouts stop
+    at the move limit. The playouts are split evenly between the workers, and with more
+    than one worker every process grows its own tree and the root moves' visits and wins
+    are added up at the end; 0 workers uses one process per core. Either budget can be
+    None to leave it unlimited, but at least one of them should be given. If report is
+    True, the number of playouts and playouts per second are printed.
+    '''
+    if not piece_util.generate_legal_moves(position):
+        return None
+
+    if num_workers == 0:
+        num_workers = multiprocessing.cpu_count()
+    if seed is None:
+        seed = random.randrange(1 << 30)
+    playouts_per_worker = -(-max_playouts // num_workers) if max_playouts is not None else None
+    tasks = [(position, moves_played, playouts_per_worker, time_ms, seed + x) for x in range(num_workers)]
+
+    start_time = time.time()
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.map(run_tree, tasks, chunksize=1)
+    else:
+        results = [run_tree(tasks[0])]
+    elapsed_time = time.time() - start_time
+
+    root_stats = merge_root_stats(results)
+    # a playout at the move limit can't try a root move, so there may be no stats to choose from
+    if not root_stats:
+        return piece_util.generate_legal_moves(position)[0]
+    move = max(root_stats, key=lambda x: root_stats[x][0])
+    if report:
+        playouts = sum(x[1] for x in results)
+        visits, wins = root_stats[move]
+        print("Playouts: " + str(playouts) +
+              " Time: " + "{:.3f}".format(elapsed_time) +
+              " Playouts/second: " + str(int(playouts / elapsed_time) if elapsed_time > 0 else playouts) +
+              " Best move: " + piece_util.convert_move_to_string(move) +
+              " Visits: " + str(visits) +
+              " Win rate: " + "{:.3f}".format(wins / visits))
+    return move
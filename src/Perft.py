@@ -0,0 +1,58 @@
+import time
+
+import PieceUtils as piece_util
+
+
+def perft(board, depth):
+    ''' Returns the number of leaf nodes in the tree of legal moves depth plies deep
+
+    Every move, drop and promotion choice counts as a separate node. The moves are
+    made and unmade on the board, so the board is unchanged when the function returns.
+    At the last ply the legal moves are counted without being made.
+    '''
+    if depth == 0:
+        return 1
+
+    moves = piece_util.generate_legal_moves(board)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def divide(board, depth):
+    ''' Returns a list of (move string, leaf nodes) for every legal root move, sorted by move string '''
+    results = []
+    for move in piece_util.generate_legal_moves(board):
+        board.make_move(move)
+        results.append((piece_util.convert_move_to_string(move), perft(board, depth - 1)))
+        board.unmake_move()
+    return sorted(results)
+
+
+def run_perft(board, depth):
+    ''' Return type void
+
+    Prints the number of leaf nodes under every root move, the total number of
+    leaf nodes and how many nodes per second were counted.
+    '''
+    start_time = time.time()
+    if depth > 0:
+        results = divide(board, depth)
+    else:
+        results = []
+    elapsed_time = time.time() - start_time
+    nodes = sum(x[1] for x in results) if depth > 0 else 1
+
+    for move_string, move_nodes in results:
+        print(move_string + ": " + str(move_nodes))
+    print("")
+    print("Depth: " + str(depth))
+    print("Nodes: " + str(nodes))
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Nodes/second: " + str(int(nodes / elapsed_time) if elapsed_time > 0 else nodes))
@@ -1,33 +1,64 @@
-import operator
-import sys
-
 import GameBoard as game_board
 import Player as player
-import Utils as util
 
 
-def convert_board_pos_to_index(position):
-    ''' Returns an index position of a piece given a board location '''
-    return int(position) - 1
+def convert_square_to_file_and_rank(square):
+    ''' Returns the 0-based (file, rank) of a square index '''
+    return square % game_board.NUM_COLS, square // game_board.NUM_COLS
 
 
-def piece_owned_by_player(current_player, piece_name):
-    ''' Returns a boolean regarding whether a player can move a piece '''
-    if piece_name == '':
-        return False
+def convert_file_and_rank_to_square(file, rank):
+    ''' Returns the square index of a 0-based file and rank or None if it is off the board '''
+    if 0 <= file < game_board.NUM_COLS and 0 <= rank < game_board.NUM_ROWS:
+        return rank * game_board.NUM_COLS + file
+    return None
 
-    if piece_name in current_player.get_pieces().keys():
-        return True
-    return False
 
+# (file, rank) offsets of the squares a step piece can move to while facing up the
+# board. Pieces owned by the UPPER player face down the board, so their rank offsets
+# are mirrored when the tables are built.
+STEP_OFFSETS = {
+    'k': [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)],
+    'g': [(0, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)],
+    's': [(-1, -1), (1, -1), (-1, 1), (0, 1), (1, 1)],
+    'p': [(0, 1)],
+    # the single steps promoted rooks and bishops add to their sliding moves
+    'x': [(-1, -1), (1, -1), (-1, 1), (1, 1)],
+    'o': [(0, -1), (-1, 0), (1, 0), (0, 1)],
+}
 
-def get_piece_at_location(board, location):
-    ''' Returns the name of a piece as a string or None if there is no piece at that location '''
-    col, row = convert_board_pos_to_index(location[1]), convert_board_pos_to_index(game_board.map_char_to_num[location[0]])
 
-    if board[row][col] == '':
+def build_step_tables():
+    ''' Returns the destination squares and masks of every step piece, side and origin square
+
+    Both tables are keyed by (piece kind, player enum) and hold a list indexed by
+    origin square. The moves table holds a tuple of destination squares and the
+    masks table holds the same squares as a bitboard.
+    '''
+    step_moves = dict()
+    step_masks = dict()
+    for piece, offsets in STEP_OFFSETS.items():
+        for side in player.PLAYER:
+            facing = 1 if side is player.LOWER else -1
+            moves_by_square = []
+            for square in range(game_board.NUM_SQUARES):
+                file, rank = convert_square_to_file_and_rank(square)
+                destinations = [convert_file_and_rank_to_square(file + file_step, rank + facing * rank_step)
+                                for file_step, rank_step in offsets]
+                moves_by_square.append(tuple(sorted(x for x in destinations if x is not None)))
+            step_moves[piece, side] = moves_by_square
+            step_masks[piece, side] = [sum(game_board.SQUARE_BITS[x] for x in moves) for moves in moves_by_square]
+    return step_moves, step_masks
+
+
+STEP_MOVES, STEP_MASKS = build_step_tables()
+
+
+def get_piece_at_square(board, square):
+    ''' Returns the name of a piece as a string or None if there is no piece on that square '''
+    if board.is_empty(square):
         return None
-    return board[row][col]
+    return board.get_piece(square)
 
 
 def promote_piece(piece_name):
@@ -35,494 +66,383 @@ def promote_piece(piece_name):
 
     Given the current state of the board, a piece name, and a location,
     this function creates a promoted piece and inserts it at the given
-    location. This function operates under the assumption that the piece 
+    location. This function operates under the assumption that the piece
     can be promoted by the current player.
     '''
     return'+' + piece_name
 
 
-def can_be_promoted(piece_name, piece_origin, piece_dstination):
-    ''' Returns a boolean regarding whether or not a piece can be promoted
-    '''
-    if piece_name[0] == '+':
-        return False
-    piece = piece_name.lower()
-
-    if piece == "k" or piece == "g":
-        return False
-    if ord(piece_name) < 97:
-        if piece_origin[1] == '1' or piece_dstination[1] == '1':
-            return True
-        return False
-    else:
-        if piece_origin[1] == '5' or piece_dstination[1] == '5':
-            return True
-        return False
-
-
-def should_pawn_be_promoted(piece_name, current_player, board_destination):
+def should_pawn_be_promoted(piece_name, current_player, destination):
+    ''' Returns a boolean regarding whether a pawn has to be promoted because it reaches the last row '''
     if piece_name.lower() != "p":
         return False
-    col = convert_board_pos_to_index(board_destination[1])
-
-    if player.map_player_name_to_enum[current_player.name] is player.UPPER and col+1 == 1:
-        return True
-    elif col+1 == 5:
-        return True
-    return False
+    return destination // game_board.NUM_COLS == PROMOTION_RANK[current_player.side]
 
 
-def can_make_move(board, current_player, piece_name, origin_location, destination_location):
-    ''' Returns a boolean of whether or not the destination is in list of possible moves
-    
-    This functions checks to make sure a player is legally allowed to move his or her piece
-    into the destination_location position. If the player does not own the piece trying to be
-    moved, the function returns False. If the player already owns the destination piece, the 
-    function returns False.
-    '''
+def make_move(board, origin, destination, promote=False):
+    board.make_move((origin, destination, promote, None))
 
-    if not piece_owned_by_player(current_player, piece_name):
-        return False
-    destination_piece = get_piece_at_location(board, destination_location)
-
-    if destination_piece is not None:
-        if piece_owned_by_player(current_player, destination_piece):
-            return False
-    return True
+    return board
 
 
-def make_move(board, piece_name, origin, destination):
-    origin_col, origin_row = convert_board_pos_to_index(origin[1]), convert_board_pos_to_index(game_board.map_char_to_num[origin[0]])
-    destination_col, destination_row = convert_board_pos_to_index(destination[1]), convert_board_pos_to_index(game_board.map_char_to_num[destination[0]])
+def drop_piece(board, current_player, piece_name, square):
+    if current_player.side is player.UPPER:
+        piece_name = str(piece_name).upper()
 
-    board[origin_row][origin_col] = ''
-    board[destination_row][destination_col] = piece_name
+    board.make_move((None, square, False, piece_name))
 
     return board
 
+#
+# ALL FUNCTIONS TO FIND ATTACKED SQUARES
+#
 
-def can_drop_piece(board, piece_name, current_player, drop_location, lower_captures, upper_captures):
-    # TODO........
-    # A pawn may not be dropped onto a square onto a square that results in checkmate
-    col, row = convert_board_pos_to_index(drop_location[1]), convert_board_pos_to_index(game_board.map_char_to_num[drop_location[0]])
-
-    if board[row][col] != '':
-        return False
-    if player.map_player_name_to_enum[current_player.name] is player.UPPER:
-        if piece_name.upper() not in upper_captures:
-            return False
-        if piece_name is 'p' and not can_drop_pawn(board, 'P', current_player, drop_location):
-            return False
-    else:
-        if piece_name not in lower_captures:
-            return False 
-        if piece_name is 'p' and not can_drop_pawn(board, 'p', current_player, drop_location):
-            return False
-    return True
 
+ROOK_DIRECTIONS = [(0, 1), (0, -1), (-1, 0), (1, 0)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def build_ray_table(directions):
+    ''' Returns, for every square, a list of the squares along each direction ordered outward from it '''
+    rays = []
+    for square in range(game_board.NUM_SQUARES):
+        origin_file, origin_rank = convert_square_to_file_and_rank(square)
+        square_rays = []
+        for file_step, rank_step in directions:
+            ray = []
+            file, rank = origin_file + file_step, origin_rank + rank_step
+            while 0 <= file < game_board.NUM_COLS and 0 <= rank < game_board.NUM_ROWS:
+                ray.append(rank * game_board.NUM_COLS + file)
+                file, rank = file + file_step, rank + rank_step
+            if ray:
+                square_rays.append(tuple(ray))
+        rays.append(square_rays)
+    return rays
+
+
+ROOK_RAYS = build_ray_table(ROOK_DIRECTIONS)
+BISHOP_RAYS = build_ray_table(BISHOP_DIRECTIONS)
+
+# Names of the pieces that attack like each step table or slider, for each player
+ATTACKER_NAMES = dict()
+for side in player.PLAYER:
+    convert_case = str.upper if side is player.UPPER else str.lower
+    ATTACKER_NAMES[side] = {
+        'k': [convert_case(x) for x in ['k', '+r', '+b']],
+        'g': [convert_case(x) for x in ['g', '+s', '+p']],
+        's': [convert_case('s')],
+        'p': [convert_case('p')],
+        'r': [convert_case(x) for x in ['r', '+r']],
+        'b': [convert_case(x) for x in ['b', '+b']],
+    }
+
+
+def is_square_attacked(board, square, by_side):
+    ''' Returns a boolean regarding whether any piece of the player by_side can move to the square
+
+    Instead of generating the moves of every attacking piece, this looks outward
+    from the target square. A step piece attacks the square if it stands on a square
+    the same kind of piece owned by the other player could step to from the target,
+    because the opposing players face opposite directions. A sliding piece attacks the
+    square if it is the first piece hit along one of the rays leading out of the square.
+    '''
+    bitboards = board.bitboards
+    attacker_names = ATTACKER_NAMES[by_side]
+    mirrored_side = player.UPPER if by_side is player.LOWER else player.LOWER
+
+    for piece in ['p', 'g', 's', 'k']:
+        attackers = 0
+        for piece_name in attacker_names[piece]:
+            attackers |= bitboards[piece_name]
+        if attackers & STEP_MASKS[piece, mirrored_side][square]:
+            return True
 
-def can_drop_pawn(board, piece_name, current_player, drop_location):
-    drop_row_idx = convert_board_pos_to_index(drop_location[1])
-    promotion_zone = 1 if player.map_player_name_to_enum[current_player.name] is player.UPPER else 5
-    pawn_to_check_for = 'P' if player.map_player_name_to_enum[current_player.name] is player.UPPER else 'p'
-    
-    # Can player drop pawn into the promotion zone
-    if drop_row_idx+1 == promotion_zone:
-        return False
+    squares = board.squares
+    for piece, rays in [('r', ROOK_RAYS), ('b', BISHOP_RAYS)]:
+        sliders = attacker_names[piece]
+        if not (bitboards[sliders[0]] | bitboards[sliders[1]]):
+            continue
+        for ray in rays[square]:
+            for ray_square in ray:
+                if squares[ray_square] != '':
+                    if squares[ray_square] in sliders:
+                        return True
+                    break
+    return False
 
-    # Check for other pawns in the same column as the desired drop location.
-    column = convert_board_pos_to_index(game_board.map_char_to_num[drop_location[0]])
-    for idx in range(0,game_board.NUM_ROWS):
-        if board[column][idx] == pawn_to_check_for:
-            return False
 
-    # will pawn next move generate opposing player be in check?
-    move = generate_moves_by_piece(piece_name, drop_location, current_player, board, False)[0]
-    pawn_next_row = convert_board_pos_to_index(game_board.map_char_to_num[move[0]])
-    pawn_next_col = convert_board_pos_to_index(move[1])
-    king_to_check_for = 'k' if player.map_player_name_to_enum[current_player.name] is player.UPPER else 'K'
-    
-    if board[pawn_next_col][pawn_next_row] is king_to_check_for:
-        return False
+#
+# ALL FUNCTIONS TO GENERATE PLAYER MOVES
+#
 
-    return True
+PROMOTABLE_PIECES = ['s', 'b', 'r', 'p']
+
+# The rank in which each player's pieces are promoted
+PROMOTION_RANK = {player.LOWER: game_board.NUM_ROWS - 1, player.UPPER: 0}
+
+# The step tables and the rays used to generate the moves of each piece, ignoring which player owns it
+map_piece_to_movement = {
+    "k": (['k'], []),
+    "g": (['g'], []),
+    "s": (['s'], []),
+    "p": (['p'], []),
+    "+s": (['g'], []),
+    "+p": (['g'], []),
+    "r": ([], ROOK_RAYS),
+    "b": ([], BISHOP_RAYS),
+    "+r": (['x'], ROOK_RAYS),
+    "+b": (['o'], BISHOP_RAYS),
+}
 
 
-def drop_piece(board, current_player, piece_name, drop_location):
-    if player.map_player_name_to_enum[current_player.name] is player.UPPER:
-        piece_name = str(piece_name).upper()
+def generate_piece_destinations(board, piece_name, origin, side):
+    ''' Returns the list of squares the piece on origin can move to without landing on its own pieces '''
+    steps, rays = map_piece_to_movement[piece_name.lower()]
+    own_pieces = board.occupancy[side]
+    occupied = own_pieces | board.occupancy[1 - side]
+    square_bits = game_board.SQUARE_BITS
+    destinations = []
+
+    for step in steps:
+        for square in STEP_MOVES[step, side][origin]:
+            if not own_pieces & square_bits[square]:
+                destinations.append(square)
+    if rays:
+        for ray in rays[origin]:
+            for square in ray:
+                bit = square_bits[square]
+                if own_pieces & bit:
+                    break
+                destinations.append(square)
+                if occupied & bit:
+                    break
+    return destinations
 
-    col, row = convert_board_pos_to_index(drop_location[1]), convert_board_pos_to_index(game_board.map_char_to_num[drop_location[0]])
-    board[row][col] = piece_name
 
-    return board
+def find_checkers_and_pins(board, king_square, side):
+    ''' Returns the pieces checking the player's king, the squares that block a check and the pinned pieces
 
-# 
-# ALL FUNCTIONS TO GENERATE PLAYER MOVES
-#
+    The checkers and blocking squares are bitboards. The pins are a dict that maps
+    the square of every pinned piece to a bitboard of the squares it can still move
+    to, which are the squares between the king and the pinning piece and the square
+    of the pinning piece itself.
+    '''
+    enemy = 1 - side
+    attacker_names = ATTACKER_NAMES[enemy]
+    bitboards = board.bitboards
+    checkers = 0
+    for piece in ['p', 'g', 's', 'k']:
+        attackers = 0
+        for piece_name in attacker_names[piece]:
+            attackers |= bitboards[piece_name]
+        checkers |= attackers & STEP_MASKS[piece, side][king_square]
+
+    block_squares = 0
+    pins = dict()
+    squares = board.squares
+    own_pieces = board.occupancy[side]
+    square_bits = game_board.SQUARE_BITS
+    for piece, rays in [('r', ROOK_RAYS), ('b', BISHOP_RAYS)]:
+        sliders = attacker_names[piece]
+        if not (bitboards[sliders[0]] | bitboards[sliders[1]]):
+            continue
+        for ray in rays[king_square]:
+            pinned_square = None
+            path = 0
+            for ray_square in ray:
+                bit = square_bits[ray_square]
+                if squares[ray_square] == '':
+                    path |= bit
+                elif own_pieces & bit:
+                    if pinned_square is not None:
+                        break
+                    pinned_square = ray_square
+                    path |= bit
+                else:
+                    if squares[ray_square] in sliders:
+                        if pinned_square is None:
+                            checkers |= bit
+                            block_squares |= path
+                        else:
+                            pins[pinned_square] = path | bit
+                    break
+    return checkers, block_squares, pins
 
 
-def generate_moves_by_piece(piece_name, origin, current_player, board, skip):
-    ''' Return a list of potential moves based on the piece name and direction
+def generate_legal_moves(board):
+    ''' Returns every legal move, drop and promotion choice for the side to move
 
-    The piece can be facing upwards or downwards on the board and can be promoted. 
-    All of those can affect the way in which a piece can move. When generating moves,
-    each is added to a set of potential moves, as the set preserves unique elements.
-    At the end of the function, the set is converted to a list and sorted.
+    The pieces checking the king and the pinned pieces are found first, so every
+    move can be generated as legal without making it and testing whether the king
+    is left in check. When the king is in check from two pieces, only the king can
+    move. When it is in check from one piece, other pieces have to capture the
+    checking piece or block it, and drops have to block it. Pinned pieces can only
+    move along the line between the king and the pinning piece. The only move that
+    is made on the board to test it is a pawn drop that checks the opposing king,
+    because a pawn can't be dropped to give checkmate.
 
-    Facing 'up' the board means the piece is moving toward the nth row. Facing down
-    the board means the piece is moving toward the 0th row.
+    Moves are (origin, destination, promote, drop_piece) tuples as used by
+    Position.make_move.
     '''
-    direction = None
-    potential_moves = list()
-    direction = 'l' if player.map_player_name_to_enum[current_player.name] is player.UPPER else 'u'
-    origin_col, origin_row = convert_board_pos_to_index(origin[1]), convert_board_pos_to_index(game_board.map_char_to_num[origin[0]])
-    piece_name = piece_name.lower()
-
-    for move in map_piece_to_moves[piece_name]:
-        potential_moves += move(piece_name, origin_col, origin_row, current_player, board, skip)
-    try:
-        potential_moves = set(potential_moves)
-        potential_moves = ["".join([game_board.map_num_to_char[i[1]], str(i[0])]) for i in potential_moves]
-        potential_moves = sorted(potential_moves, key=lambda x: (x[0], x[1]))
-    except:
-        print("Failed to convert potential_moves to board positions: " + str(list(set(potential_moves))))
-        sys.exit()
-    return potential_moves
-
-
-def generate_king_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
-
-    col_lower_bound = max(1, origin_col)
-    col_upper_bound = min(game_board.NUM_COLS, origin_col+2)
-
-    row_lower_bound = max(1, origin_row)
-    row_upper_bound = min(game_board.NUM_ROWS, origin_row+2)
-
-    for i in range(col_lower_bound, col_upper_bound+1):
-        for j in range(row_lower_bound, row_upper_bound+1):
-            if j-1 == origin_row and i-1 == origin_col:
+    side = board.side_to_move
+    enemy = 1 - side
+    promotion_rank = PROMOTION_RANK[side]
+    num_cols = game_board.NUM_COLS
+    square_bits = game_board.SQUARE_BITS
+    own_pieces = board.occupancy[side]
+    moves = []
+
+    king_name = 'K' if side is player.UPPER else 'k'
+    king_square = board.find_piece(king_name)
+    if king_square is None:
+        checkers, block_squares, pins = 0, 0, dict()
+    else:
+        checkers, block_squares, pins = find_checkers_and_pins(board, king_square, side)
+
+        # the king is lifted off the board so that it can't hide behind itself from a sliding piece
+        board.remove_piece(king_square)
+        for destination in STEP_MOVES['k', side][king_square]:
+            if not own_pieces & square_bits[destination] and not is_square_attacked(board, destination, enemy):
+                moves.append((king_square, destination, False, None))
+        board.place_piece(king_name, king_square)
+
+        # only the king can get out of check from two pieces at once
+        if checkers & (checkers - 1):
+            return moves
+
+    target_squares = checkers | block_squares if checkers else game_board.FULL_BOARD
+    for origin, piece_name in board.iterate_pieces(side):
+        if origin == king_square:
+            continue
+        allowed_squares = target_squares & pins[origin] if origin in pins else target_squares
+        piece = piece_name.lower()
+        promotable = piece in PROMOTABLE_PIECES
+        origin_in_zone = origin // num_cols == promotion_rank
+        for destination in generate_piece_destinations(board, piece_name, origin, side):
+            if not allowed_squares & square_bits[destination]:
+                continue
+            if promotable and (origin_in_zone or destination // num_cols == promotion_rank):
+                moves.append((origin, destination, True, None))
+                if piece == 'p':
+                    continue
+            moves.append((origin, destination, False, None))
+
+    drop_squares = game_board.FULL_BOARD & ~board.get_occupied()
+    if checkers:
+        drop_squares &= block_squares
+    if not drop_squares or not board.captures[side]:
+        return moves
+
+    for piece_name in sorted(set(board.captures[side])):
+        if piece_name.lower() != 'p':
+            for square in game_board.iterate_squares(drop_squares):
+                moves.append((None, square, False, piece_name))
+            continue
+
+        enemy_king_square = find_king(board, enemy)
+        for square in game_board.iterate_squares(get_pawn_drop_squares(board, piece_name, drop_squares, side)):
+            move = (None, square, False, piece_name)
+            if enemy_king_square in STEP_MOVES['p', side][square] and is_pawn_drop_checkmate(board, move):
                 continue
-            else:
-                potential_moves.add((i,j))
-    return potential_moves
+            moves.append(move)
+    return moves
 
 
-def generate_rook_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
+def get_pawn_drop_squares(board, piece_name, drop_squares, side):
+    ''' Returns the drop squares where a pawn can go, which are not on the last row or on a file with another pawn of the player '''
+    pawn_drop_squares = drop_squares & ~game_board.RANK_MASKS[PROMOTION_RANK[side]]
+    for file_mask in game_board.FILE_MASKS:
+        if board.bitboards[piece_name] & file_mask:
+            pawn_drop_squares &= ~file_mask
+    return pawn_drop_squares
 
-    # Checking in the up direction
-    idx = origin_col-1
-    while idx >= 0:
-        if not piece_owned_by_player(current_player, board[origin_row][idx]):
-            potential_moves.add((idx+1, origin_row+1))
-            if not skip and board[origin_row][idx] != '':
-                break
-        else:
-            break
-        idx -= 1
-
-    # Checking in the down direction
-    idx = origin_col+1
-    while idx < game_board.NUM_COLS:
-        if not piece_owned_by_player(current_player, board[origin_row][idx]):
-            potential_moves.add((idx+1, origin_row+1))
-            if not skip and board[origin_row][idx] != '':
-                break
-        else:
-            break
-        idx += 1
-
-    # Checking in the left direction
-    idx = origin_row-1
-    while idx >= 0:
-        if not piece_owned_by_player(current_player, board[idx][origin_col]):
-            potential_moves.add((origin_col+1, idx+1))
-            if not skip and board[idx][origin_col] != '':
-                break
-        else:
-            break
-        idx -= 1
-
-    # Checking in the right direction
-    idx = origin_row+1
-    while idx < game_board.NUM_ROWS:
-        if not piece_owned_by_player(current_player, board[idx][origin_col]):
-            potential_moves.add((origin_col+1, idx+1))
-            if not skip and board[idx][origin_col] != '':
-                break
-        else:
-            break
-        idx += 1
-
-    return potential_moves
 
+def is_pawn_drop_checkmate(board, move):
+    board.make_move(move)
+    is_checkmate = not has_legal_move(board)
+    board.unmake_move()
+    return is_checkmate
 
-# figure out how to stop bishop from jumping over pieces -- probably take in the board and check values
-def generate_bishop_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
-    col, row = origin_col+1, origin_row+1
 
-    # Checking the LOWER LEFT direction
-    offset = 1
-    while 1 <= col-offset  and 1 <= row-offset:
-        if not piece_owned_by_player(current_player, board[row-offset-1][col-offset-1]):
-            potential_moves.add((col-offset, row-offset))
-            if not skip and board[row-offset-1][col-offset-1] != '':
-                break
-        else:
-            break
-        offset += 1
-
-    # Checking the LOWER RIGHT direction
-    offset = 1
-    while 1 <= col-offset  and game_board.NUM_COLS >= row+offset:
-        if not piece_owned_by_player(current_player, board[row+offset-1][col-offset-1]):
-            potential_moves.add((col-offset, row+offset))
-            if not skip and board[row+offset-1][col-offset-1] != '':
-                break
-        else:
-            break
-        offset += 1
-
-    # Checking the UPPER LEFT direction
-    offset = 1
-    while game_board.NUM_COLS >= col+offset  and 1 <= row-offset: 
-        if not piece_owned_by_player(current_player, board[row-offset-1][col+offset-1]):
-            potential_moves.add((col+offset, row-offset))
-            if not skip and board[row-offset-1][col+offset-1] != '':
-                break
-        else:
-            break
-        offset += 1
-
-    # Checking the UPPER RIGHT direction
-    offset = 1
-    while game_board.NUM_COLS >= col+offset  and game_board.NUM_ROWS >= row+offset: 
-        if not piece_owned_by_player(current_player, board[row+offset-1][col+offset-1]):
-            potential_moves.add((col+offset, row+offset))
-            if not skip and board[row+offset-1][col+offset-1] != '':
-                break
-        else:
-            break
-        offset += 1
+def has_legal_move(board):
+    ''' Returns a boolean regarding whether the side to move has at least one legal move
 
-    return potential_moves
-
-
-def generate_gold_general_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
-    void_spots = [(origin_col+1, origin_row+1)]
-
-    col_lower_bound, col_upper_bound = max(1, origin_col), min(game_board.NUM_COLS, origin_col+2)
-    row_lower_bound, row_upper_bound = max(1, origin_row), min(game_board.NUM_ROWS, origin_row+2)
-
-    if player.map_player_name_to_enum[current_player.name] is player.LOWER:
-        void_spots += [(origin_col, origin_row), 
-                       (origin_col, origin_row+2)]
+    This is the same as checking whether generate_legal_moves returns any moves, but it
+    stops at the first legal move it finds. The moves that are cheapest to check and most
+    likely to be legal are tried first: king moves, then captures of the checking piece,
+    then moves that block the check and finally drops.
+    '''
+    side = board.side_to_move
+    enemy = 1 - side
+    square_bits = game_board.SQUARE_BITS
+    own_pieces = board.occupancy[side]
+
+    king_name = 'K' if side is player.UPPER else 'k'
+    king_square = board.find_piece(king_name)
+    if king_square is None:
+        checkers, block_squares, pins = 0, 0, dict()
     else:
-        void_spots += [(origin_col+2, origin_row), 
-                       (origin_col+2, origin_row+2)]
-
-    for i in range(col_lower_bound, col_upper_bound+1):
-        for j in range(row_lower_bound, row_upper_bound+1):
-            if (i,j) in void_spots:
-                continue
-            else:
-                potential_moves.add((i,j))
-    return potential_moves
-
-
-def generate_silver_general_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
-    void_spots = [(origin_col+1, origin_row+1)]
+        checkers, block_squares, pins = find_checkers_and_pins(board, king_square, side)
 
-    col_lower_bound, col_upper_bound = max(1, origin_col), min(game_board.NUM_COLS, origin_col+2)
-    row_lower_bound, row_upper_bound = max(1, origin_row), min(game_board.NUM_ROWS, origin_row+2)
+        board.remove_piece(king_square)
+        has_king_move = False
+        for destination in STEP_MOVES['k', side][king_square]:
+            if not own_pieces & square_bits[destination] and not is_square_attacked(board, destination, enemy):
+                has_king_move = True
+                break
+        board.place_piece(king_name, king_square)
+        if has_king_move:
+            return True
 
-    if player.map_player_name_to_enum[current_player.name] is player.LOWER:
-        void_spots += [(origin_col+1, origin_row+2), 
-                       (origin_col+1, origin_row),
-                       (origin_col, origin_row+1)]
-    else:
-        void_spots += [(origin_col+1, origin_row), 
-                       (origin_col+1, origin_row+2),
-                       (origin_col+2, origin_row+1)]
+        if checkers & (checkers - 1):
+            return False
 
-    for i in range(col_lower_bound, col_upper_bound+1):
-        for j in range(row_lower_bound, row_upper_bound+1):
-            if (i,j) in void_spots:
+    # a piece that can move to a square can always make some legal move there, promoted or not
+    for target_squares in ([checkers, block_squares] if checkers else [game_board.FULL_BOARD]):
+        if not target_squares:
+            continue
+        for origin, piece_name in board.iterate_pieces(side):
+            if origin == king_square:
                 continue
-            else:
-                potential_moves.add((i,j))
-    return potential_moves
-
-
-def generate_pawn_moves(piece_name, origin_col, origin_row, current_player, board, skip):
-    potential_moves = set()
-
-    if ord(piece_name) > 97:
-        if player.map_player_name_to_enum[current_player.name] is player.UPPER and origin_col >= 1:
-            potential_moves.add((origin_col, origin_row+1))
-        else:
-            if origin_col+1 <= game_board.NUM_ROWS:
-                potential_moves.add((origin_col+2, origin_row+1))
-
-    return potential_moves
-
-
-map_piece_to_moves = {
-    "k": [generate_king_moves],
-    "r": [generate_rook_moves],
-    "+r": [generate_king_moves, generate_rook_moves],
-    "b": [generate_bishop_moves],
-    "+b": [generate_king_moves, generate_bishop_moves],
-    "g": [generate_gold_general_moves],
-    "s": [generate_silver_general_moves],
-    "+s": [generate_gold_general_moves],
-    "p": [generate_pawn_moves],
-    "+p": [generate_gold_general_moves],
-}
+            allowed_squares = target_squares & pins[origin] if origin in pins else target_squares
+            if not allowed_squares:
+                continue
+            for destination in generate_piece_destinations(board, piece_name, origin, side):
+                if allowed_squares & square_bits[destination]:
+                    return True
+
+    drop_squares = game_board.FULL_BOARD & ~board.get_occupied()
+    if checkers:
+        drop_squares &= block_squares
+    if not drop_squares or not board.captures[side]:
+        return False
 
+    for piece_name in set(board.captures[side]):
+        if piece_name.lower() != 'p':
+            return True
+    pawn_name = board.captures[side][0]
+    enemy_king_square = find_king(board, enemy)
+    for square in game_board.iterate_squares(get_pawn_drop_squares(board, pawn_name, drop_squares, side)):
+        move = (None, square, False, pawn_name)
+        if enemy_king_square not in STEP_MOVES['p', side][square] or not is_pawn_drop_checkmate(board, move):
+            return True
+    return False
 
-# 
-# ALL FUNCTIONS TO GENERATE DANGEROUS PIECE IMMEDIATE FUTURE LOCATIONS
-#
 
+def find_king(board, side):
+    return board.find_piece('K' if side is player.UPPER else 'k')
 
-def generate_attacks_by_piece(piece_name, origin, king_loc, player, board):
-    ''' Return a list of potential attack moves by a dangerous piece
 
-    A dangerous piece is one of the following players: r,+r,b,+b. These
-    players are dangerous because they have been determined to have a direct
-    route to the king and are within more than +/- positions of the current
-    dangerous piece location.
-
-    The range of attack locations is needed to help determine moves for escaping
-    check for players.
-    '''
-    direction = None
-    attack_moves = list()
-    piece_name = piece_name.lower()
-
-    origin_col, origin_row = convert_board_pos_to_index(origin[1]), convert_board_pos_to_index(game_board.map_char_to_num[origin[0]])
-    king_col, king_row = convert_board_pos_to_index(king_loc[1]), convert_board_pos_to_index(game_board.map_char_to_num[king_loc[0]])
-
-    attack_func = map_dangerous_pieces_to_moves[piece_name]
-    attack_moves = attack_func(origin_col, origin_row, king_col, king_row, player, board)
-
-    try:
-        attack_moves = set(attack_moves)
-        attack_moves = ["".join([game_board.map_num_to_char[i[1]], str(i[0])]) for i in attack_moves]
-        attack_moves = sorted(attack_moves, key=lambda x: (x[0], x[1]))
-    except:
-        print("Failed to convert potential_moves to board positions: " + str(list(set(potential_moves))))
-        sys.exit()
-    return attack_moves
-
-
-def generate_rook_attack(origin_col, origin_row, king_col, king_row, player, board):
-    attack_moves = set()
-
-    col, row = origin_col+1, origin_row+1
-    king_col, king_row = king_col+1, king_row+1
-
-    if row == king_row:
-        if col > king_col:
-            attack_moves.add((origin_col+1, origin_row+1))
-            idx = origin_col-1
-            while idx > king_col:
-                if board[origin_row][idx] == '':
-                    attack_moves.add((idx+1, origin_row+1))
-                else:
-                    break
-                idx -= 1
-
-        if col < king_col:
-            attack_moves.add((origin_col+1, origin_row+1))
-            idx = origin_col+1
-            while idx < king_col:
-                if board[origin_row][idx] == '':
-                    attack_moves.add((idx+1, origin_row+1))
-                else:
-                    break
-                idx += 1
-
-    if col == king_col:
-        if row > king_row:
-            attack_moves.add((origin_col+1, origin_row+1))
-            idx = origin_row-1
-            while idx > king_row:
-                if board[idx][origin_col] == '':
-                    attack_moves.add((origin_col+1, idx+1))
-                else:
-                    break
-                idx -= 1
-        if row < king_row:
-            attack_moves.add((origin_col+1, origin_row+1))
-            idx = origin_row+1
-            while idx < king_row:
-                if board[idx][origin_col] == '':
-                    attack_moves.add((origin_col+1, idx+1))
-                else:
-                    break
-                idx += 1
-    return attack_moves
-
-
-def generate_bishop_attack(origin_col, origin_row, king_col, king_row, player, board):
-    attack_moves = set()
-    col, row = origin_col+1, origin_row+1
-    king_col, king_row = king_col+1, king_row+1
-    offset = 1
-
-    # Checking the UPPER RIGHT direction
-    if king_col > col and king_row > row:
-        if king_col - col == king_row - row:
-            attack_moves.add((origin_col+1, origin_row+1))
-            while game_board.NUM_COLS >= col+offset  and game_board.NUM_ROWS >= row+offset: 
-                if board[row+offset-1][col+offset-1] == '':
-                    attack_moves.add((col+offset, row+offset))
-                else:
-                    break
-                offset += 1
-    # Checking the LOWER RIGHT direction
-    elif king_col < col and king_row > row:
-        difference = col - king_col
-        if row + difference == king_row:
-            attack_moves.add((origin_col+1, origin_row+1))
-            while 1 <= col-offset  and game_board.NUM_COLS >= row+offset:
-                if board[row+offset-1][col-offset-1] == '':
-                    attack_moves.add((col-offset, row+offset))
-                else:
-                    break
-                offset += 1
-    # Checking the UPPER LEFT direction
-    elif king_col > col and king_row < row:
-        difference = row - king_row
-        if king_col - difference == col:
-            attack_moves.add((col, row))
-            while game_board.NUM_COLS >= col+offset  and 1 <= row-offset: 
-                if board[row-offset-1][col+offset-1] == '':
-                    attack_moves.add((col+offset, row-offset))
-                offset += 1
-    # Checking the LOWER LEFT direction
-    elif king_col < col and king_row < row:
-        if col - king_col == row - king_col:
-            attack_moves.add((col, row))
-            while 1 <= col-offset  and 1 <= row-offset:
-                if board[row-offset-1][col-offset-1] == '':
-                    attack_moves.add((col+offset, row+offset))
-                else:
-                    break
-                offset += 1
-    return attack_moves
+def is_in_check(board, side):
+    ''' Returns a boolean regarding whether the king of the player is attacked '''
+    king_square = find_king(board, side)
+    return king_square is not None and is_square_attacked(board, king_square, 1 - side)
 
 
-map_dangerous_pieces_to_moves = {
-    "r": generate_rook_attack,
-    "+r": generate_rook_attack,
-    "b": generate_bishop_attack,
-    "+b": generate_bishop_attack,
-}
+def convert_move_to_string(move):
+    ''' Returns a move tuple in the same format as the moves typed by players, e.g. 'move a1 a2 promote' '''
+    origin, destination, promote, drop_piece = move
+    if origin is None:
+        return 'drop ' + drop_piece.lower() + ' ' + game_board.convert_square_to_location(destination)
+    move_string = 'move ' + game_board.convert_square_to_location(origin) + ' ' + game_board.convert_square_to_location(destination)
+    return move_string + ' promote' if promote else move_string
@@ -0,0 +1,286 @@
+import mmap
+import os
+import struct
+import sys
+import time
+
+import Batch as batch
+import Game as game
+import GameRecord as game_record
+import Player as player
+import Utils as utils
+
+DATABASE_MAGIC = b'MSPD'
+DATABASE_VERSION = 1
+# number of games, number of slots in the position table and in the prefix table, padded
+# to the size of a slot so that every slot starts on a multiple of its size
+HEADER_FORMAT = '<4sH2xIII12x'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# key, number of occurrences, number of games and the results of those games
+SLOT_FORMAT = '<QIIIIII'
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+# the results a game can end with, counted once for every game that reached a position
+RESULTS = [LOWER_WIN, UPPER_WIN, DRAW, UNFINISHED] = ['lower wins', 'UPPER wins', 'Draw', 'Unfinished']
+
+MASK_64 = (1 << 64) - 1
+
+
+def mix_prefix_key(prefix_key, move_code):
+    ''' Returns the key of a move sequence extended by one move, see get_prefix_keys
+
+    The move code is mixed in with the finalizer of the splitmix64 generator, so that every
+    bit of the key depends on every move and on the order of the moves.
+    '''
+    key = (prefix_key ^ (move_code + 1)) * 0x9E3779B97F4A7C15 & MASK_64
+    key = (key ^ (key >> 30)) * 0xBF58476D1CE4E5B9 & MASK_64
+    key = (key ^ (key >> 27)) * 0x94D049BB133111EB & MASK_64
+    return key ^ (key >> 31)
+
+
+def get_prefix_keys(start_hash, moves):
+    ''' Returns the key of every prefix of a list of move tuples, from no moves to all of them
+
+    The key of no moves is the Zobrist hash of the starting position, so the same moves
+    played from different positions are different prefixes.
+    '''
+    prefix_keys = [start_hash]
+    for move in moves:
+        prefix_keys.append(mix_prefix_key(prefix_keys[-1], game_record.encode_move(move)))
+    return prefix_keys
+
+
+def get_game_result(game_instance):
+    if not game_instance.is_game_over:
+        return UNFINISHED
+    if game_instance.winning_player is None:
+        return DRAW
+    return LOWER_WIN if game_instance.winning_player.get_side() is player.LOWER else UPPER_WIN
+
+
+def get_num_slots(num_keys):
+    ''' Returns the smallest power of two that keeps the table at most half full '''
+    num_slots = 1
+    while num_slots < 2 * num_keys:
+        num_slots <<= 1
+    return num_slots
+
+
+def build_table(counts):
+    ''' Returns the bytes of an open addressing hash table of the counts of every key
+
+    A key goes in the slot given by its low bits, or the next free slot after it. Since
+    the keys are hashes, the low bits are spread evenly and the table is at most half
+    full, so a lookup only has to look at a slot or two.
+    '''
+    num_slots = get_num_slots(len(counts))
+    table = bytearray(num_slots * SLOT_SIZE)
+    occupied = bytearray(num_slots)
+    for key, key_counts in counts.items():
+        slot = key & (num_slots - 1)
+        while occupied[slot]:
+            slot = (slot + 1) & (num_slots - 1)
+        occupied[slot] = 1
+        struct.pack_into(SLOT_FORMAT, table, slot * SLOT_SIZE, key, *key_counts)
+    return num_slots, table
+
+
+class PositionDatabaseBuilder(object):
+    ''' Counts how often every position and every move sequence came up in a set of games and how those games ended
+
+    Positions are keyed on their Zobrist hash, which includes the captures and the side
+    to move. Move sequences are keyed on the starting position and the moves played
+    from it, see get_prefix_keys, so a prefix only counts the games that began with
+    exactly those moves, while a position also counts the games that reached it by
+    other moves. The counts are kept in dicts until the database is saved.
+    '''
+    def __init__(self):
+        self.num_games = 0
+        self.num_positions = 0
+        self.position_counts = dict()
+        self.prefix_counts = dict()
+
+    def add_keys(self, counts, keys, result_index):
+        ''' Return type void
+
+        Counts every key as an occurrence and every different key once more as a game that
+        ended with the result.
+        '''
+        for key in keys:
+            key_counts = counts.get(key)
+            if key_counts is None:
+                key_counts = counts[key] = [0] * (2 + len(RESULTS))
+            key_counts[0] += 1
+        for key in set(keys):
+            key_counts = counts[key]
+            key_counts[1] += 1
+            key_counts[2 + result_index] += 1
+
+    def add_test_case(self, test_case):
+        ''' Return type void
+
+        Plays the moves of a game read from a game file and counts the starting position
+        and the position after every move that was made. An illegal move ends the game
+        without reaching a new position, as in convert_test_case.
+        '''
+        game_instance = game.Game('f', test_case=test_case)
+        game_instance.replay()
+        game_instance.check_game_over_status()
+        result_index = RESULTS.index(get_game_result(game_instance))
+
+        board = game_instance.game_board
+        undo_stack = board.undo_stack
+        # every undo record holds the hash of the position before its move
+        position_keys = [x[4] for x in undo_stack] + [board.hash]
+        prefix_keys = get_prefix_keys(position_keys[0], [x[0] for x in undo_stack])
+
+        self.add_keys(self.position_counts, position_keys, result_index)
+        self.add_keys(self.prefix_counts, prefix_keys, result_index)
+        self.num_games += 1
+        self.num_positions += len(position_keys)
+
+    def save(self, filename):
+        ''' Return type void
+
+        Writes the database to a new file next to the given one and then renames it over
+        the given one, so a reader that has the old file memory mapped keeps reading the
+        old file and no reader ever sees a file that is half written.
+        '''
+        num_position_slots, position_table = build_table(self.position_counts)
+        num_prefix_slots, prefix_table = build_table(self.prefix_counts)
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, DATABASE_MAGIC, DATABASE_VERSION, self.num_games, num_position_slots, num_prefix_slots))
+            f.write(position_table)
+            f.write(prefix_table)
+        os.replace(temp_filename, filename)
+
+
+class PositionDatabase(object):
+    ''' A position database file memory mapped for reading
+
+    The file is a header followed by two open addressing hash tables of fixed size
+    slots, one for positions and one for move sequences. Looking up a key reads the
+    slot given by the low bits of the key and the slots after it up to the first empty
+    one, straight from the mapped file, so a lookup costs the same no matter how many
+    games are in the database and nothing is read until it is needed. The file is never
+    written once it is saved, so any number of processes can map and read it at once.
+    '''
+    def __init__(self, database_file, entries, num_games, num_position_slots, num_prefix_slots):
+        self.database_file = database_file
+        self.entries = entries
+        self.num_games = num_games
+        self.num_position_slots = num_position_slots
+        self.num_prefix_slots = num_prefix_slots
+
+    def lookup(self, key, table_offset, num_slots):
+        slot = key & (num_slots - 1)
+        while True:
+            slot_counts = struct.unpack_from(SLOT_FORMAT, self.entries, table_offset + slot * SLOT_SIZE)
+            if slot_counts[1] == 0:
+                return None
+            if slot_counts[0] == key:
+                return slot_counts
+            slot = (slot + 1) & (num_slots - 1)
+
+    def get_counts(self, slot_counts):
+        ''' Returns a dict() with the counts of a key
+
+        Dict contains the following:
+
+        occurrences: the number of times the position or move sequence came up, counting repeats within a game
+        games: the number of games it came up in
+        results: dict() of every result in RESULTS to the number of those games that ended with it
+        '''
+        if slot_counts is None:
+            slot_counts = (0,) * (3 + len(RESULTS))
+        return dict(occurrences=slot_counts[1], games=slot_counts[2],
+                    results=dict((x, slot_counts[3 + i]) for i, x in enumerate(RESULTS)))
+
+    def lookup_position(self, board):
+        ''' Returns a dict() with the counts of the Position, see get_counts '''
+        return self.get_counts(self.lookup(board.hash, HEADER_SIZE, self.num_position_slots))
+
+    def lookup_prefix(self, start_board, moves):
+        ''' Returns a dict() with the counts of the games that began in the start Position with the move tuples, see get_counts '''
+        prefix_key = get_prefix_keys(start_board.hash, moves)[-1]
+        return self.get_counts(self.lookup(prefix_key, HEADER_SIZE + self.num_position_slots * SLOT_SIZE, self.num_prefix_slots))
+
+    def close(self):
+        if self.database_file is not None:
+            self.entries.close()
+            self.database_file.close()
+            self.database_file = None
+        self.entries = None
+
+
+def load_position_database(filename):
+    ''' Returns a PositionDatabase whose slots are read from the memory mapped file on demand '''
+    try:
+        database_file = open(filename, 'rb')
+        entries = mmap.mmap(database_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_games, num_position_slots, num_prefix_slots = struct.unpack_from(HEADER_FORMAT, entries, 0)
+    except (IOError, ValueError, struct.error):
+        print("There was an error reading the position database file: " + str(filename) + ". Exiting...")
+        sys.exit()
+
+    if magic != DATABASE_MAGIC or version != DATABASE_VERSION \
+            or len(entries) != HEADER_SIZE + (num_position_slots + num_prefix_slots) * SLOT_SIZE:
+        print("The file " + str(filename) + " is not a valid position database. Exiting...")
+        sys.exit()
+    return PositionDatabase(database_file, entries, num_games, num_position_slots, num_prefix_slots)
+
+
+def build_position_database(path, database_filename):
+    ''' Return type void
+
+    Reads every game in the .in files in a directory or matching a glob pattern, counts
+    every position and move sequence in them and saves the counts to the database file.
+    A file can hold many games, as read by utils.iterateTestCases.
+    '''
+    start_time = time.time()
+    builder = PositionDatabaseBuilder()
+    for filename in batch.find_game_files(path):
+        for test_case in utils.iterateTestCases(filename):
+            builder.add_test_case(test_case)
+    builder.save(database_filename)
+    elapsed_time = time.time() - start_time
+
+    print("Games: " + str(builder.num_games))
+    print("Positions: " + str(builder.num_positions))
+    print("Different positions: " + str(len(builder.position_counts)))
+    print("Different move sequences: " + str(len(builder.prefix_counts)))
+    print("Size: " + str(os.path.getsize(database_filename)) + " bytes")
+    print("Time: " + "{:.3f}".format(elapsed_time) + " seconds")
+    print("Games/second: " + "{:.1f}".format(builder.num_games / elapsed_time if elapsed_time > 0 else builder.num_games))
+
+
+def print_counts(counts):
+    print("Occurrences: " + str(counts['occurrences']))
+    print("Games: " + str(counts['games']))
+    for result in RESULTS:
+        print(result + ": " + str(counts['results'][result]))
+
+
+def run_lookup(database_filename, game_instance):
+    ''' Return type void
+
+    Prints how often the game's current position came up in the database and how those
+    games ended, and the same for the moves the game was played with from its starting
+    position, e.g. the moves of a -f file.
+    '''
+    database = load_position_database(database_filename)
+    board = game_instance.game_board
+    moves = [x[0] for x in board.undo_stack]
+    start_board = board.copy()
+    for _ in moves:
+        start_board.unmake_move()
+
+    print("Position: " + game_instance.get_position_string())
+    print_counts(database.lookup_position(board))
+    print("")
+    print("Moves: " + str(len(moves)))
+    print_counts(database.lookup_prefix(start_board, moves))
+    print("")
+    print("Database games: " + str(database.num_games))
+    database.close()
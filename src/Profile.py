@@ -0,0 +1,116 @@
+import copy
+import json
+import time
+
+import Game as game
+import GameBoard as game_board
+import PieceUtils as piece_util
+
+PHASES = [MOVE_GENERATION, CHECK_DETECTION, ESCAPE_MOVE_SEARCH, CHECKMATE_VERIFICATION, BOARD_COPIES, DEEPCOPIES, OUTPUT_RENDERING] = \
+    ['move_generation', 'check_detection', 'escape_move_search', 'checkmate_verification', 'board_copies', 'deepcopies', 'output_rendering']
+
+
+class Profiler(object):
+    ''' Counts the calls to and the wall time spent in each phase of the game
+
+    A phase is measured by replacing the functions that make it up with wrappers that
+    count calls and time them, so nothing is measured, and nothing costs any time,
+    unless profiling is turned on. Every call is counted in its own phase, but only the
+    outermost measured call is timed: a function of any phase called from another one,
+    e.g. check detection while verifying checkmate, is part of the time of the phase
+    that called it. The phases never overlap, so their times add up to at most the
+    total time. The number of moves generated is also counted for every ply of the game.
+    '''
+    def __init__(self):
+        self.calls = dict((x, 0) for x in PHASES)
+        self.seconds = dict((x, 0.0) for x in PHASES)
+        self.depth = 0
+        self.moves_generated = 0
+        self.moves_generated_per_ply = []
+        self.start_time = time.time()
+        self.instrumented = []
+
+    def instrument(self, owner, name, phase, count_moves=False):
+        ''' Replaces the function or method called name on a module or class with one that measures it '''
+        original = getattr(owner, name)
+        profiler = self
+
+        def profiled(*args, **kwargs):
+            profiler.calls[phase] += 1
+            if profiler.depth:
+                result = original(*args, **kwargs)
+            else:
+                profiler.depth += 1
+                start_time = time.perf_counter()
+                try:
+                    result = original(*args, **kwargs)
+                finally:
+                    profiler.seconds[phase] += time.perf_counter() - start_time
+                    profiler.depth -= 1
+            if count_moves:
+                profiler.moves_generated += len(result)
+            return result
+
+        setattr(owner, name, profiled)
+        self.instrumented.append((owner, name, original))
+
+    def instrument_deepcopies(self, cls, phase):
+        ''' Measures copy.deepcopy of the instances of a class only, by giving the class a __deepcopy__ that copies them as deepcopy would '''
+        def deepcopy_instance(instance, memo):
+            copied_instance = cls.__new__(cls)
+            memo[id(instance)] = copied_instance
+            copied_instance.__dict__.update(copy.deepcopy(instance.__dict__, memo))
+            return copied_instance
+
+        setattr(cls, '__deepcopy__', deepcopy_instance)
+        self.instrumented.append((cls, '__deepcopy__', None))
+        self.instrument(cls, '__deepcopy__', phase)
+
+    def instrument_plies(self, owner, name):
+        ''' Replaces the method that plays one ply with one that records the moves generated during it '''
+        original = getattr(owner, name)
+        profiler = self
+
+        def profiled(*args, **kwargs):
+            moves_generated = profiler.moves_generated
+            result = original(*args, **kwargs)
+            profiler.moves_generated_per_ply.append(profiler.moves_generated - moves_generated)
+            return result
+
+        setattr(owner, name, profiled)
+        self.instrumented.append((owner, name, original))
+
+    def remove_instrumentation(self):
+        for owner, name, original in reversed(self.instrumented):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.instrumented = []
+
+    def get_summary(self):
+        return dict(phases=dict((x, dict(calls=self.calls[x], seconds=round(self.seconds[x], 6))) for x in PHASES),
+                    moves_generated=self.moves_generated,
+                    plies=len(self.moves_generated_per_ply),
+                    moves_generated_per_ply=self.moves_generated_per_ply,
+                    total_seconds=round(time.time() - self.start_time, 6))
+
+    def write_summary(self, filename):
+        ''' Appends the summary to the file as one line of JSON, so the summaries of many runs can be collected in one file '''
+        with open(filename, 'a') as f:
+            f.write(json.dumps(self.get_summary(), sort_keys=True) + '\n')
+
+
+def start_profiling():
+    ''' Returns a Profiler that measures every phase of the game from now on '''
+    profiler = Profiler()
+    profiler.instrument(piece_util, 'generate_legal_moves', MOVE_GENERATION, count_moves=True)
+    profiler.instrument(piece_util, 'is_in_check', CHECK_DETECTION)
+    profiler.instrument(game.Game, 'get_escape_moves', ESCAPE_MOVE_SEARCH)
+    profiler.instrument(piece_util, 'has_legal_move', CHECKMATE_VERIFICATION)
+    profiler.instrument(game_board.Position, 'copy', BOARD_COPIES)
+    profiler.instrument_deepcopies(game.Game, DEEPCOPIES)
+    profiler.instrument(game.Game, 'print_last_action', OUTPUT_RENDERING)
+    profiler.instrument(game.Game, 'print_escape_moves', OUTPUT_RENDERING)
+    profiler.instrument_plies(game.Game, 'play_move')
+    return profiler
@@ -0,0 +1,124 @@
+import random
+import sys
+
+import Game as game
+import GameBoard as game_board
+import GameRecord as game_record
+import Perft as perft
+import PieceUtils as piece_util
+
+# leaf nodes of the legal move tree from the beginning state, one entry per depth from 1
+PERFT_COUNTS = [14, 181, 2512, 35401, 533203]
+
+# positions with promoted pieces, pieces in hand and either player to move, besides the ones reached by random games
+POSITION_STRINGS = [
+    'rbsgk/4p/5/P4/KGSBR l - 1',
+    'rbsgk/4p/5/P4/KGSBR U - 2',
+    '4k/5/2+B2/5/K3+s l 2R2GS2P 7',
+    '+r1s1k/2G2/1p3/5/1K3 l RPbgs 31',
+    '4K/5/5/5/k4 l - 400',
+]
+# positions that can't come up in a game: too many bishops, two lower kings and the player who just moved in check
+INVALID_POSITION_STRINGS = [
+    '4k/5/2+B2/5/K3+s l 2R2B2GS2P 7',
+    '4k/5/5/5/K3k l - 1',
+    '4K/5/5/5/k3r l - 1',
+]
+NUM_RANDOM_GAMES = 20
+MAX_RANDOM_PLIES = 80
+
+
+def check_perft():
+    ''' Returns a list of error messages for every depth whose perft count from the beginning state is wrong '''
+    board = game.Game('i').game_board
+    errors = []
+    for depth, expected_nodes in enumerate(PERFT_COUNTS, 1):
+        nodes = perft.perft(board, depth)
+        if nodes != expected_nodes:
+            errors.append("perft " + str(depth) + ": expected " + str(expected_nodes) + " nodes, got " + str(nodes))
+    return errors
+
+
+def check_position_string(position, move_number):
+    ''' Returns a list of error messages if the Position doesn't come back unchanged from its position string '''
+    position_string = position.to_position_string(move_number)
+    parsed_position = game_board.parse_position_string(position_string)
+    if parsed_position is None:
+        return ["position " + position_string + ": could not be parsed"]
+
+    parsed_board, parsed_move_number = parsed_position
+    errors = []
+    if parsed_board.to_position_string(parsed_move_number) != position_string:
+        errors.append("position " + position_string + ": written back as " + parsed_board.to_position_string(parsed_move_number))
+    if parsed_board.squares != position.squares or parsed_board.side_to_move != position.side_to_move \
+            or [sorted(x) for x in parsed_board.captures] != [sorted(x) for x in position.captures]:
+        errors.append("position " + position_string + ": parsed into a different position")
+    if parsed_board.hash != position.hash:
+        errors.append("position " + position_string + ": parsed with a different hash")
+    return errors
+
+
+def check_move_codes(position):
+    ''' Returns a list of error messages for every legal move whose 16-bit code doesn't decode back into the move '''
+    errors = []
+    codes = set()
+    for move in piece_util.generate_legal_moves(position):
+        code = game_record.encode_move(move)
+        decoded_move = game_record.decode_move(code, position.side_to_move)
+        if decoded_move != move:
+            errors.append(piece_util.convert_move_to_string(move) + ": decoded as " + str(decoded_move))
+        if not 0 <= code < 1 << 16 or code in codes:
+            errors.append(piece_util.convert_move_to_string(move) + ": code " + str(code) + " is not a unique 16-bit code")
+        codes.add(code)
+    return errors
+
+
+def check_positions():
+    ''' Returns a list of error messages for the position strings and move codes of the listed positions and of random games '''
+    errors = []
+    for position_string in POSITION_STRINGS:
+        parsed_position = game_board.parse_position_string(position_string)
+        if parsed_position is None:
+            errors.append("position " + position_string + ": could not be parsed")
+            continue
+        position, move_number = parsed_position
+        if position.to_position_string(move_number) != position_string:
+            errors.append("position " + position_string + ": written back as " + position.to_position_string(move_number))
+        errors.extend(check_move_codes(position))
+    for position_string in INVALID_POSITION_STRINGS:
+        if game_board.parse_position_string(position_string) is not None:
+            errors.append("position " + position_string + ": was parsed but isn't a valid position")
+
+    # the games are always the same, so a failure can be repeated
+    rng = random.Random(0)
+    for _ in range(NUM_RANDOM_GAMES):
+        board = game.Game('i').game_board
+        for ply in range(MAX_RANDOM_PLIES):
+            errors.extend(check_position_string(board, ply // 2 + 1))
+            errors.extend(check_move_codes(board))
+            moves = piece_util.generate_legal_moves(board)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+    return errors
+
+
+def main():
+    ''' Return type void
+
+    Runs every check and prints the errors, if any, like RunTestsWithDiff.sh prints only
+    the diffs of the tests that fail. Exits with status 1 if any check fails.
+    '''
+    failed = False
+    for name, check in [('perft', check_perft), ('position strings and move codes', check_positions)]:
+        print("Running regression tests... \t " + name)
+        errors = check()
+        for error in errors:
+            print(error)
+        failed = failed or bool(errors)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
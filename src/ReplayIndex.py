@@ -0,0 +1,123 @@
+import sys
+
+import Game as game
+import Player as player
+
+DEFAULT_SNAPSHOT_INTERVAL = 16
+
+
+def get_check_flags(game_instance):
+    return (game_instance.lower_player.in_check, game_instance.lower_player.in_checkmate,
+            game_instance.upper_player.in_check, game_instance.upper_player.in_checkmate)
+
+
+def set_check_flags(game_instance, check_flags):
+    game_instance.lower_player.in_check, game_instance.lower_player.in_checkmate, \
+        game_instance.upper_player.in_check, game_instance.upper_player.in_checkmate = check_flags
+
+
+class ReplayIndex(object):
+    ''' Any ply of a game, restored without playing the game again from the first move
+
+    The game is played once when the index is built. Every snapshot_interval plies, the
+    full state of the game is kept: a copy of the Position, which holds the squares and
+    both players' captures, and the check flags. Every ply in between keeps a small delta
+    instead: the move string, the move tuple that was made on the board (None for an
+    illegal move) and the check flags after the ply. Seeking a ply restores the
+    snapshot at or before it and applies the deltas after it, so it costs at most
+    snapshot_interval moves, no matter how far into the game the ply is.
+    '''
+    def __init__(self, game_instance, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.game = game_instance
+        self.snapshot_interval = snapshot_interval
+        self.start_num_moves = game_instance.num_moves
+        self.start_side = game_instance.current_player.side
+        self.snapshots = [self.take_snapshot()]
+        self.deltas = []
+
+        self.last_undo_length = len(game_instance.game_board.undo_stack)
+        game_instance.replay(self.add_ply)
+        game_instance.check_game_over_status()
+
+        self.game_over_state = (game_instance.is_game_over, game_instance.game_over_message,
+                                game_instance.game_over_reason, game_instance.winning_player)
+
+    def take_snapshot(self):
+        game_instance = self.game
+        position = game_instance.game_board.copy()
+        position.undo_stack = []
+        return position, get_check_flags(game_instance)
+
+    def add_ply(self, move):
+        ''' Return type void
+
+        Records the delta of the ply that was just played and takes a snapshot if the ply
+        is a multiple of the snapshot interval.
+        '''
+        game_instance = self.game
+        undo_stack = game_instance.game_board.undo_stack
+        board_move = undo_stack[-1][0] if len(undo_stack) > self.last_undo_length else None
+        self.last_undo_length = len(undo_stack)
+
+        self.deltas.append((move, board_move, get_check_flags(game_instance)))
+        if len(self.deltas) % self.snapshot_interval == 0:
+            self.snapshots.append(self.take_snapshot())
+
+    def get_num_plies(self):
+        return len(self.deltas)
+
+    def seek(self, ply):
+        ''' Returns the move string of the ply or None for the first ply after restoring the game to after that ply
+
+        The game the index was built from is restored in place, so it can be printed or
+        played on from there like any other game.
+        '''
+        game_instance = self.game
+        snapshot_ply = ply - ply % self.snapshot_interval
+        position, check_flags = self.snapshots[snapshot_ply // self.snapshot_interval]
+
+        board = position.copy()
+        for move, board_move, check_flags in self.deltas[snapshot_ply:ply]:
+            if board_move is not None:
+                board.make_move(board_move)
+
+        game_instance.game_board = board
+        game_instance.lower_player.captures = board.captures[player.LOWER]
+        game_instance.upper_player.captures = board.captures[player.UPPER]
+        set_check_flags(game_instance, check_flags)
+        game_instance.num_moves = self.start_num_moves + ply
+        game_instance.current_player = game_instance.upper_player if self.start_side ^ (ply & 1) else game_instance.lower_player
+
+        if ply == len(self.deltas):
+            game_instance.is_game_over, game_instance.game_over_message, game_instance.game_over_reason, \
+                game_instance.winning_player = self.game_over_state
+        else:
+            game_instance.is_game_over, game_instance.game_over_message, game_instance.game_over_reason, \
+                game_instance.winning_player = False, None, None, None
+        return self.deltas[ply - 1][0] if ply else None
+
+    def print_ply(self, ply):
+        ''' Return type void
+
+        Prints the game after the ply the same way print_last_action does while the game is
+        played, followed by how the game ended if it ended at that ply.
+        '''
+        move = self.seek(ply)
+        game_instance = self.game
+        game_instance.print_last_action(game_instance.game_board, game_instance.lower_player.captures,
+                                        game_instance.upper_player.captures, move)
+        if game_instance.is_game_over:
+            print(game_instance.game_over_message)
+
+
+def run_seek(filename, ply, debug_mode=False):
+    ''' Return type void
+
+    Builds the replay index of the game in a file and prints the game after the given ply.
+    '''
+    replay_index = ReplayIndex(game.Game('f', filename, debug_mode))
+    if ply < 0 or ply > replay_index.get_num_plies():
+        print("The game in " + str(filename) + " has " + str(replay_index.get_num_plies()) + " plies, so ply " +
+              str(ply) + " can't be shown. Exiting...")
+        sys.exit()
+    replay_index.print_ply(ply)
@@ -0,0 +1,297 @@
+import time
+
+import GameBoard as game_board
+import PieceUtils as piece_util
+import Tablebase as tablebase_util
+import TranspositionCache as transposition_cache
+
+MATE_SCORE = 100000
+MAX_DEPTH = 64
+MAX_QUIESCENCE_DEPTH = 8
+MAX_QUIESCENCE_DROP_DEPTH = 1
+DEFAULT_TIME_MS = 1000
+DEFAULT_CACHE_ENTRIES = 1 << 18
+NODES_BETWEEN_BUDGET_CHECKS = 1024
+
+# bounds stored with a score in the search cache
+BOUNDS = [EXACT, LOWER_BOUND, UPPER_BOUND] = [0, 1, 2]
+
+PIECE_VALUES = game_board.PIECE_VALUES
+HAND_VALUES = game_board.HAND_VALUES
+
+
+def evaluate(board):
+    ''' Returns the score of the position in favor of the side to move, which the position keeps up to date as moves are made '''
+    return board.get_score(board.side_to_move)
+
+
+def is_capture(board, move):
+    return move[0] is not None and board.squares[move[1]] != ''
+
+
+def order_moves(board, moves, best_move=None):
+    ''' Returns the moves sorted so that the ones most likely to be good are searched first
+
+    The best move found for the position by an earlier search goes first, then captures
+    of the most valuable pieces by the least valuable ones, then promotions.
+    '''
+    def score_move(move):
+        if move == best_move:
+            return -1 << 20
+        origin, destination, promote, drop_piece = move
+        if origin is None:
+            return 0
+        score = -PIECE_VALUES[board.squares[destination].lower()] * 16 if board.squares[destination] else 0
+        if score:
+            score += PIECE_VALUES[board.squares[origin].lower()] // 100
+        return score - 100 if promote else score
+    return sorted(moves, key=score_move)
+
+
+def score_to_cache(score, ply):
+    ''' Returns a mate score relative to the position being stored instead of the root '''
+    if score > MATE_SCORE - MAX_DEPTH * 2:
+        return score + ply
+    if score < -MATE_SCORE + MAX_DEPTH * 2:
+        return score - ply
+    return score
+
+
+def score_from_cache(score, ply):
+    if score > MATE_SCORE - MAX_DEPTH * 2:
+        return score - ply
+    if score < -MATE_SCORE + MAX_DEPTH * 2:
+        return score + ply
+    return score
+
+
+def score_tablebase_result(tablebase_result, ply):
+    ''' Returns the score of a position that was found in a tablebase '''
+    result, plies = tablebase_result
+    if result == tablebase_util.WIN:
+        return MATE_SCORE - ply - plies
+    if result == tablebase_util.LOSS:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+class Search(object):
+    ''' Negamax alpha-beta search with iterative deepening
+
+    The search makes and unmakes moves on the position it is given, so the position
+    is back in its original state when the search returns. Each iteration searches one
+    ply deeper than the last and starts with the best moves found so far, which are kept
+    in a TranspositionCache keyed on the Zobrist hash of each position. At the leaves, a
+    quiescence search keeps playing captures and checking drops so that a position isn't
+    scored in the middle of an exchange. Positions that are in the tablebase, if one is
+    given, are scored from it without being searched.
+
+    The search stops when it runs out of time or nodes. The result of an iteration that
+    was stopped early is thrown away and the best move of the last full iteration is used.
+    '''
+    def __init__(self, board, time_ms=DEFAULT_TIME_MS, max_nodes=None, cache=None, tablebase=None):
+        self.board = board
+        self.tablebase = tablebase
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.cache = cache if cache is not None else transposition_cache.TranspositionCache(DEFAULT_CACHE_ENTRIES)
+        self.nodes = 0
+        self.deadline = None
+        self.is_stopped = False
+        self.iterations = []
+
+    def check_budget(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.is_stopped = True
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.is_stopped = True
+
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_BUDGET_CHECKS == 0:
+            self.check_budget()
+
+    def negamax(self, depth, alpha, beta, ply):
+        ''' Returns the score of the position for the side to move searched depth plies deep '''
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply, 0)
+
+        self.count_node()
+        if self.is_stopped:
+            return 0
+
+        board = self.board
+        if self.tablebase is not None and ply > 0:
+            tablebase_result = self.tablebase.probe(board)
+            if tablebase_result is not None:
+                return score_tablebase_result(tablebase_result, ply)
+
+        cache_key = ('search', board.hash)
+        cache_entry = self.cache.get(cache_key)
+        cached_move = None
+        if cache_entry is not None:
+            cached_depth, cached_score, bound, cached_move = cache_entry
+            if cached_depth >= depth and ply > 0:
+                cached_score = score_from_cache(cached_score, ply)
+                if bound == EXACT:
+                    return cached_score
+                if bound == LOWER_BOUND and cached_score >= beta:
+                    return cached_score
+                if bound == UPPER_BOUND and cached_score <= alpha:
+                    return cached_score
+
+        moves = piece_util.generate_legal_moves(board)
+        if not moves:
+            return -MATE_SCORE + ply
+
+        original_alpha = alpha
+        best_score = -MATE_SCORE - 1
+        best_move = None
+        for move in order_moves(board, moves, cached_move):
+            board.make_move(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if self.is_stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.cache.put(cache_key, (depth, score_to_cache(best_score, ply), bound, best_move))
+        return best_score
+
+    def quiescence(self, alpha, beta, ply, quiescence_depth):
+        ''' Returns the score of the position once no captures or checking drops are left to play
+
+        When the side to move is in check, every move that escapes check is searched.
+        Otherwise the side to move can stand pat on the material score or play a capture
+        or a drop that gives check.
+        '''
+        self.count_node()
+        if self.is_stopped:
+            return 0
+
+        board = self.board
+        side = board.side_to_move
+        in_check = piece_util.is_in_check(board, side)
+        if not in_check:
+            stand_pat = evaluate(board)
+            if stand_pat >= beta or quiescence_depth >= MAX_QUIESCENCE_DEPTH:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+
+        moves = piece_util.generate_legal_moves(board)
+        if not moves:
+            return -MATE_SCORE + ply
+        if not in_check:
+            # checking drops are only tried on the first ply so that a player with a full hand
+            # can't keep the quiescence search going by dropping pieces one after another
+            if quiescence_depth < MAX_QUIESCENCE_DROP_DEPTH:
+                moves = [x for x in moves if is_capture(board, x) or x[0] is None]
+            else:
+                moves = [x for x in moves if is_capture(board, x)]
+
+        for move in order_moves(board, moves):
+            board.make_move(move)
+            # drops are only searched here if they put the opposing king in check
+            if not in_check and move[0] is None and not piece_util.is_in_check(board, 1 - side):
+                board.unmake_move()
+                continue
+            score = -self.quiescence(-beta, -alpha, ply + 1, quiescence_depth + 1)
+            board.unmake_move()
+            if self.is_stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def search_root(self, depth, root_moves):
+        ''' Returns a tuple of (score, best_move) for the side to move searched depth plies deep '''
+        board = self.board
+        alpha = -MATE_SCORE - 1
+        beta = MATE_SCORE + 1
+        best_move = None
+        for move in root_moves:
+            board.make_move(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, 1)
+            board.unmake_move()
+            if self.is_stopped:
+                break
+            if score > alpha:
+                alpha = score
+                best_move = move
+        if not self.is_stopped:
+            self.cache.put(('search', board.hash), (depth, alpha, EXACT, best_move))
+        return alpha, best_move
+
+    def iterate(self, max_depth=MAX_DEPTH, report=False):
+        ''' Returns the best move found before the search runs out of depth, time or nodes
+
+        Returns None if the side to move has no legal moves. If report is True, the depth,
+        score, nodes searched, nodes per second and best move of every finished iteration
+        are printed.
+        '''
+        start_time = time.time()
+        self.deadline = start_time + self.time_ms / 1000.0 if self.time_ms is not None else None
+        self.nodes = 0
+        self.is_stopped = False
+        self.iterations = []
+
+        root_moves = order_moves(self.board, piece_util.generate_legal_moves(self.board))
+        if not root_moves:
+            return None
+
+        best_move = root_moves[0]
+        for depth in range(1, max_depth + 1):
+            score, iteration_move = self.search_root(depth, root_moves)
+            if self.is_stopped:
+                break
+
+            best_move = iteration_move
+            elapsed_time = time.time() - start_time
+            iteration = dict(depth=depth, score=score, nodes=self.nodes, time=elapsed_time,
+                             nodes_per_second=int(self.nodes / elapsed_time) if elapsed_time > 0 else self.nodes,
+                             best_move=best_move)
+            self.iterations.append(iteration)
+            if report:
+                print_iteration(iteration)
+
+            root_moves = [best_move] + [x for x in root_moves if x != best_move]
+            if abs(score) > MATE_SCORE - MAX_DEPTH * 2:
+                break
+            # the next iteration takes several times longer, so don't start it if it can't finish
+            if self.deadline is not None and time.time() + elapsed_time * 2 > self.deadline:
+                break
+        return best_move
+
+
+def print_iteration(iteration):
+    print("Depth: " + str(iteration['depth']) +
+          " Score: " + str(iteration['score']) +
+          " Nodes: " + str(iteration['nodes']) +
+          " Time: " + "{:.3f}".format(iteration['time']) +
+          " Nodes/second: " + str(iteration['nodes_per_second']) +
+          " Best move: " + piece_util.convert_move_to_string(iteration['best_move']))
+
+
+def best_move(position, time_ms=DEFAULT_TIME_MS, max_nodes=None, cache=None, report=False, tablebase=None):
+    ''' Returns the best move tuple for the side to move found within the time and node budget
+
+    Returns None if the side to move has no legal moves. Either budget can be None to
+    leave it unlimited, but at least one of them should be given. The cache can be kept
+    between calls so that a later search starts with what an earlier one learned.
+    '''
+    search = Search(position, time_ms, max_nodes, cache, tablebase)
+    return search.iterate(report=report)
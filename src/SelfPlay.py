@@ -0,0 +1,182 @@
+import glob
+import multiprocessing
+import os
+import random
+import time
+
+import Game as game
+import GameRecord as game_record
+import MonteCarlo as monte_carlo
+import PieceUtils as piece_util
+import Search as search
+
+POLICIES = ['random', 'capture', 'alphabeta', 'mcts']
+DEFAULT_POLICY = 'random'
+# the budgets of the search policies are counted in nodes and playouts instead of time,
+# so that a game plays the same moves no matter how busy the machine is
+SELFPLAY_SEARCH_NODES = 2000
+SELFPLAY_PLAYOUTS = 100
+# every game starts with a few random moves, so that games between search policies,
+# which always pick the same move in the same position, don't all repeat one game
+OPENING_RANDOM_PLIES = 4
+
+
+def choose_random_move(game_instance, rng):
+    return rng.choice(game_instance.get_legal_moves(game_instance.game_board))
+
+
+def choose_capture_move(game_instance, rng):
+    ''' Returns a random move out of the captures of the most valuable piece, or any random move if there are no captures '''
+    board = game_instance.game_board
+    moves = game_instance.get_legal_moves(board)
+    captures = [x for x in moves if search.is_capture(board, x)]
+    if not captures:
+        return rng.choice(moves)
+    best_value = max(search.PIECE_VALUES[board.squares[x[1]].lower()] for x in captures)
+    return rng.choice([x for x in captures if search.PIECE_VALUES[board.squares[x[1]].lower()] == best_value])
+
+
+def choose_alphabeta_move(game_instance, rng):
+    return search.best_move(game_instance.game_board, None, SELFPLAY_SEARCH_NODES)
+
+
+def choose_mcts_move(game_instance, rng):
+    return monte_carlo.best_move(game_instance.game_board, game_instance.num_moves, SELFPLAY_PLAYOUTS,
+                                 seed=rng.randrange(1 << 30))
+
+
+map_policy_to_function = {
+    'random': choose_random_move,
+    'capture': choose_capture_move,
+    'alphabeta': choose_alphabeta_move,
+    'mcts': choose_mcts_move,
+}
+
+
+def play_game(policies, rng):
+    ''' Returns the finished Game after playing a game from the beginning state between two policies
+
+    policies is a list of the policy of the lower player and of the UPPER player. The moves
+    are chosen as move tuples, but they are played as move strings with Game.play_move,
+    exactly as if a player had typed them, so every rule of the game applies.
+    '''
+    game_instance = game.Game('i')
+    while True:
+        game_instance.check_game_over_status()
+        if game_instance.is_game_over:
+            return game_instance
+        # a player who isn't in check but can't move can only type an illegal move, which loses the game
+        if not piece_util.has_legal_move(game_instance.game_board):
+            game_instance.set_game_over_status(game.ILLEGAL_MOVE)
+            return game_instance
+        if game_instance.num_moves < OPENING_RANDOM_PLIES:
+            move = choose_random_move(game_instance, rng)
+        else:
+            move = map_policy_to_function[policies[game_instance.current_player.get_side()]](game_instance, rng)
+        game_instance.play_move(piece_util.convert_move_to_string(move))
+
+
+def get_shard_filename(shard_prefix, worker):
+    return shard_prefix + '.' + str(worker) + '.rec'
+
+
+def run_worker(arguments):
+    ''' Returns a dict() with what one worker played after writing its games to its own shard
+
+    Dict contains the following:
+
+    worker: the number of the worker
+    games: the number of games played
+    plies: the number of plies played
+    seconds: the wall time the worker took
+    results: dict() of the game over message to the number of games that ended with it
+    '''
+    worker, num_games, policies, seed, shard_prefix = arguments
+    rng = random.Random(seed)
+    start_time = time.time()
+    num_plies = 0
+    results = dict()
+    start_position = game.Game('i').get_position_string()
+
+    with game_record.GameRecordWriter(get_shard_filename(shard_prefix, worker)) as writer:
+        for _ in range(num_games):
+            game_instance = play_game(policies, rng)
+            num_plies += game_instance.num_moves
+            results[game_instance.game_over_message] = results.get(game_instance.game_over_message, 0) + 1
+
+            end = game.END_GAME.index(game_instance.game_over_reason) + 1
+            winner = game_record.NO_WINNER
+            if game_instance.winning_player is not None:
+                winner = game_instance.winning_player.get_side() + 1
+            moves = [x[0] for x in game_instance.game_board.undo_stack]
+            writer.write_game(start_position, moves, end, winner)
+
+    return dict(worker=worker, games=num_games, plies=num_plies, seconds=time.time() - start_time, results=results)
+
+
+def format_rates(num_games, num_plies, seconds):
+    return (str(num_games) + " games, " + str(num_plies) + " plies, " +
+            "{:.1f}".format(num_games / seconds if seconds > 0 else num_games) + " games/second, " +
+            str(int(num_plies / seconds) if seconds > 0 else num_plies) + " plies/second")
+
+
+def run_selfplay(num_games, policies, shard_prefix, num_workers=1, seed=None):
+    ''' Return type void
+
+    Plays num_games games between the policies of the lower and UPPER players, split
+    evenly over the workers, and prints how fast every worker played and how the games
+    ended. Every worker has its own random seed, which is the seed plus the number of the
+    worker, and writes its games to its own shard, a game record file named
+    shard_prefix.<worker>.rec, so the workers never share a file. 0 workers uses one
+    process per core.
+    '''
+    if num_workers == 0:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = max(1, min(num_workers, num_games))
+    if seed is None:
+        seed = random.randrange(1 << 30)
+
+    shard_directory = os.path.dirname(shard_prefix)
+    if shard_directory and not os.path.isdir(shard_directory):
+        os.makedirs(shard_directory)
+
+    tasks = [(x, num_games // num_workers + (x < num_games % num_workers), policies, seed + x, shard_prefix)
+             for x in range(num_workers)]
+    start_time = time.time()
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers) as pool:
+            worker_stats = pool.map(run_worker, tasks, chunksize=1)
+    else:
+        worker_stats = [run_worker(tasks[0])]
+    elapsed_time = time.time() - start_time
+
+    results = dict()
+    for stats in worker_stats:
+        print("Worker " + str(stats['worker']) + ": " + format_rates(stats['games'], stats['plies'], stats['seconds']) +
+              " -> " + get_shard_filename(shard_prefix, stats['worker']))
+        for message, count in stats['results'].items():
+            results[message] = results.get(message, 0) + count
+    print("")
+    for message in sorted(results):
+        print(message + " " + str(results[message]))
+    print("")
+    print("Total: " + format_rates(num_games, sum(x['plies'] for x in worker_stats), elapsed_time))
+    print("Seed: " + str(seed))
+
+
+def merge_shards(path, record_filename):
+    ''' Return type void
+
+    Copies every game of the game record files in a directory or matching a glob pattern
+    into one game record file, e.g. to merge the shards written by run_selfplay.
+    '''
+    if os.path.isdir(path):
+        path = os.path.join(path, '*.rec')
+    shard_filenames = sorted(x for x in glob.glob(path) if os.path.abspath(x) != os.path.abspath(record_filename))
+    with game_record.GameRecordWriter(record_filename) as writer:
+        for shard_filename in shard_filenames:
+            for record in game_record.read_game_records(shard_filename):
+                writer.write_move_codes(record['position'], record['moves'], record['end'], record['winner'])
+        num_games = writer.num_games
+    print("Shards: " + str(len(shard_filenames)))
+    print("Games: " + str(num_games))
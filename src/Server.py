@@ -0,0 +1,230 @@
+import asyncio
+import contextlib
+import io
+import sys
+
+import Game as game
+import Player as player
+
+DEFAULT_HOST = '127.0.0.1'
+
+LOBBY_MESSAGE = "Type 'play' to play both players, 'pair' to play against the next player who types 'pair' or 'quit' to leave."
+
+
+class Connection(object):
+    ''' A client connected to the server and the game it is playing, if any '''
+    def __init__(self, connection_id, reader, writer):
+        self.connection_id = connection_id
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.sides = []
+
+    def send(self, text):
+        if text and not self.writer.is_closing():
+            self.writer.write(text.encode())
+
+    async def flush(self):
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+class GameSession(object):
+    ''' One game played over the connection of a player playing both sides or the connections of two paired players
+
+    The rules are all left to a Game in interactive mode, which is given the moves as they
+    arrive instead of reading them with input(). Everything the Game prints is captured
+    and sent to the players, so they see exactly what they would see in interactive mode.
+    '''
+    def __init__(self, session_id, lower_connection, upper_connection, debug_mode=False):
+        self.session_id = session_id
+        self.game = game.Game('i', debug_mode=debug_mode)
+        self.connections = {player.LOWER: lower_connection, player.UPPER: upper_connection}
+
+    def get_connections(self):
+        return list(dict((x.connection_id, x) for x in self.connections.values()).values())
+
+    def send_to_all(self, text):
+        for connection in self.get_connections():
+            connection.send(text)
+
+    def start(self):
+        game_instance = self.game
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            game_instance.print_last_action(game_instance.game_board, game_instance.lower_player.captures,
+                                            game_instance.upper_player.captures)
+        self.send_to_all(output.getvalue())
+        self.begin_turn()
+
+    def begin_turn(self):
+        ''' Sends what is printed at the start of a turn and asks the current player for a move or ends the game '''
+        game_instance = self.game
+        can_move = False
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            if not game_instance.is_game_over:
+                can_move = game_instance.begin_turn()
+            if not can_move:
+                print(game_instance.game_over_message)
+        self.send_to_all(output.getvalue())
+        if can_move:
+            self.connections[game_instance.current_player.side].send(game_instance.current_player.get_name() + ">\n")
+
+    def play_move(self, connection, move):
+        ''' Return type void
+
+        Plays a move typed by a player, like a move typed in interactive mode, if it is
+        the player's turn. An illegal move ends the game just as it does in interactive mode.
+        '''
+        game_instance = self.game
+        if game_instance.current_player.side not in connection.sides:
+            connection.send("It is not your turn.\n")
+            return
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            game_instance.play_move(move)
+            game_instance.print_last_action(game_instance.game_board, game_instance.lower_player.captures,
+                                            game_instance.upper_player.captures, move)
+        self.send_to_all(output.getvalue())
+        self.begin_turn()
+
+    def is_over(self):
+        return self.game.is_game_over
+
+
+class GameServer(object):
+    ''' Hosts any number of games at once in a single process with asyncio
+
+    Every connection is a coroutine waiting for its next line, so an idle game only
+    costs its Game and a socket. A client starts by typing 'play' to play both players
+    of a new game or 'pair' to play against the next client that types 'pair', and then
+    types moves exactly as in interactive mode, e.g. 'move a1 a2' or 'drop p c3'. When
+    the game is over, the client can start another one.
+    '''
+    def __init__(self, debug_mode=False):
+        self.debug_mode = debug_mode
+        self.waiting_connection = None
+        self.num_connections = 0
+        self.num_sessions = 0
+        self.active_sessions = 0
+
+    def start_session(self, lower_connection, upper_connection):
+        self.num_sessions += 1
+        self.active_sessions += 1
+        session = GameSession(self.num_sessions, lower_connection, upper_connection, self.debug_mode)
+        lower_connection.session = session
+        upper_connection.session = session
+        lower_connection.sides = [player.LOWER]
+        upper_connection.sides = [player.UPPER]
+        if lower_connection is upper_connection:
+            lower_connection.sides = [player.LOWER, player.UPPER]
+        if self.debug_mode:
+            print("Game " + str(session.session_id) + " started. Active games: " + str(self.active_sessions))
+        session.start()
+        if session.is_over():
+            self.end_session(session)
+
+    def end_session(self, session, message=None):
+        ''' Return type void
+
+        Sends the players of a game back to the lobby, after telling them why the game ended
+        if it didn't end by itself.
+        '''
+        self.active_sessions -= 1
+        for connection in session.get_connections():
+            connection.session = None
+            connection.sides = []
+            if message:
+                connection.send(message + "\n")
+            connection.send(LOBBY_MESSAGE + "\n")
+        if self.debug_mode:
+            print("Game " + str(session.session_id) + " ended. Active games: " + str(self.active_sessions))
+
+    def handle_lobby_command(self, connection, command):
+        ''' Returns a boolean regarding whether the connection should stay open '''
+        if command == 'quit':
+            return False
+        if command == 'play':
+            self.start_session(connection, connection)
+        elif command == 'pair':
+            waiting_connection = self.waiting_connection
+            if waiting_connection is None or waiting_connection is connection:
+                self.waiting_connection = connection
+                connection.send("Waiting for another player...\n")
+            else:
+                self.waiting_connection = None
+                self.start_session(waiting_connection, connection)
+        else:
+            connection.send(LOBBY_MESSAGE + "\n")
+        return True
+
+    def leave(self, connection):
+        ''' Return type void
+
+        Removes a connection from the lobby or from the game it is playing. The game is
+        over if one of its players leaves, and a paired opponent is sent back to the lobby.
+        '''
+        if self.waiting_connection is connection:
+            self.waiting_connection = None
+        session = connection.session
+        if session is not None:
+            side = connection.sides[0]
+            self.end_session(session, player.map_player_enum_to_name[side] + " player left the game.")
+
+    async def handle_connection(self, reader, writer):
+        self.num_connections += 1
+        connection = Connection(self.num_connections, reader, writer)
+        connection.send(LOBBY_MESSAGE + "\n")
+        try:
+            while True:
+                await connection.flush()
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip('\r\n')
+
+                if connection.session is None:
+                    if not self.handle_lobby_command(connection, command.strip()):
+                        break
+                elif command.strip() == 'quit':
+                    self.leave(connection)
+                else:
+                    session = connection.session
+                    session.play_move(connection, command)
+                    if session.is_over():
+                        self.end_session(session)
+                    for other_connection in session.get_connections():
+                        if other_connection is not connection:
+                            await other_connection.flush()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(connection)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def serve(self, port, host=DEFAULT_HOST):
+        try:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        except OSError as error:
+            print("The server could not listen on " + host + ":" + str(port) + ": " + str(error) + ". Exiting...")
+            sys.exit()
+        print("Serving mini shogi on " + host + ":" + str(port))
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(port, host=DEFAULT_HOST, debug_mode=False):
+    ''' Return type void
+
+    Serves games on the port until the process is interrupted.
+    '''
+    try:
+        asyncio.run(GameServer(debug_mode).serve(port, host))
+    except KeyboardInterrupt:
+        pass
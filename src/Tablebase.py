@@ -0,0 +1,320 @@
+import array
+import mmap
+import struct
+import sys
+import time
+
+import GameBoard as game_board
+import PieceUtils as piece_util
+import Player as player
+
+TABLEBASE_MAGIC = b'MSTB'
+TABLEBASE_VERSION = 1
+# magic, version, number of entries and the material padded to 16 bytes
+HEADER_FORMAT = '<4sHI16s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = '<H'
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+# any other entry is the number of plies until checkmate plus one; the side to move
+# wins if that number of plies is odd and is checkmated if it is even
+[DRAW_ENTRY, ILLEGAL_ENTRY] = [0, 0xFFFF]
+
+RESULTS = [WIN, LOSS, DRAW] = ['Win', 'Loss', 'Draw']
+
+TABLEBASE_PIECES = ['g', 's', 'b', 'r', 'p']
+
+# every table of one or two pieces besides the kings fits, and the smallest table of three
+# pieces has about 345 million entries, far more than can be generated in memory
+MAX_TABLEBASE_ENTRIES = 1 << 24
+
+
+def parse_material(material):
+    ''' Returns the material as a sorted string of the pieces other than the kings, e.g. 'gp'
+
+    The kings are implied, so 'KG', 'kg', 'g' and 'G' all mean a gold and both kings. The
+    ownership of the pieces isn't part of the material because captured pieces change
+    sides, so a table covers every way the pieces can be split between the players, on
+    the board or in hand.
+    '''
+    pieces = sorted(x for x in material.lower() if x != 'k' and x != '+')
+    if not pieces or any(x not in TABLEBASE_PIECES for x in pieces):
+        return None
+    return ''.join(pieces)
+
+
+def get_num_piece_states(piece):
+    ''' Returns how many states a piece can be in: on any square for either player, promoted if it can be, or in either hand '''
+    num_promotions = 2 if piece in piece_util.PROMOTABLE_PIECES else 1
+    return 2 * game_board.NUM_SQUARES * num_promotions + 2
+
+
+class Tablebase(object):
+    ''' Win, loss and draw with distance to checkmate for every position with the given material
+
+    A position is indexed by the side to move, the squares of both kings and the state of
+    every other piece, so a table is a flat array of 16-bit entries that can be read at any
+    index without loading the rest of it. Positions that can't come up in a game (e.g. two
+    pieces on one square or the side that just moved still in check) are marked ILLEGAL_ENTRY.
+    A DRAW means that neither player can force checkmate; the move limit isn't taken into
+    account.
+    '''
+    def __init__(self, material):
+        self.material = parse_material(material)
+        if self.material is None:
+            print("Tablebase material '" + str(material) + "' is not valid. Exiting...")
+            sys.exit()
+        self.num_piece_states = [get_num_piece_states(x) for x in self.material]
+        self.num_entries = 2 * game_board.NUM_SQUARES * game_board.NUM_SQUARES
+        for num_states in self.num_piece_states:
+            self.num_entries *= num_states
+        self.entries = None
+        self.tablebase_file = None
+
+    def compute_index(self, board):
+        ''' Returns the index of the position in the table or None if it has different material '''
+        lower_king = board.find_piece('k')
+        upper_king = board.find_piece('K')
+        if lower_king is None or upper_king is None:
+            return None
+
+        piece_states = dict((x, []) for x in self.material)
+        for square, piece_name in enumerate(board.squares):
+            piece = piece_name[-1:].lower()
+            if piece and piece != 'k':
+                if piece not in piece_states:
+                    return None
+                num_promotions = 2 if piece in piece_util.PROMOTABLE_PIECES else 1
+                side = game_board.get_side_of_piece(piece_name)
+                piece_states[piece].append((side * game_board.NUM_SQUARES + square) * num_promotions + (piece_name[0] == '+'))
+        for side in player.PLAYER:
+            for piece_name in board.captures[side]:
+                piece = piece_name.lower()
+                if piece not in piece_states:
+                    return None
+                piece_states[piece].append(get_num_piece_states(piece) - 2 + side)
+
+        # identical pieces are interchangeable, so they are always indexed in order of their states
+        index = (board.side_to_move * game_board.NUM_SQUARES + lower_king) * game_board.NUM_SQUARES + upper_king
+        for piece in sorted(piece_states):
+            states = piece_states[piece]
+            if len(states) != self.material.count(piece):
+                return None
+            for state in sorted(states):
+                index = index * get_num_piece_states(piece) + state
+        return index
+
+    def build_position(self, index):
+        ''' Returns the Position at the index of the table or None if it is illegal '''
+        piece_states = []
+        for piece, num_states in reversed(list(zip(self.material, self.num_piece_states))):
+            piece_states.append((piece, index % num_states))
+            index //= num_states
+        upper_king = index % game_board.NUM_SQUARES
+        index //= game_board.NUM_SQUARES
+        lower_king = index % game_board.NUM_SQUARES
+        side_to_move = index // game_board.NUM_SQUARES
+
+        # identical pieces are indexed in order, so any other order is a duplicate of a legal index
+        for (piece, state), (other_piece, other_state) in zip(piece_states, piece_states[1:]):
+            if piece == other_piece and state < other_state:
+                return None
+        if lower_king == upper_king:
+            return None
+
+        position = game_board.Position()
+        position.place_piece('k', lower_king)
+        position.place_piece('K', upper_king)
+        captures = [[], []]
+        for piece, state in piece_states:
+            num_promotions = 2 if piece in piece_util.PROMOTABLE_PIECES else 1
+            if state >= 2 * game_board.NUM_SQUARES * num_promotions:
+                side = state - 2 * game_board.NUM_SQUARES * num_promotions
+                captures[side].append(piece.upper() if side is player.UPPER else piece)
+                continue
+            is_promoted = state % num_promotions
+            state //= num_promotions
+            side = state // game_board.NUM_SQUARES
+            square = state % game_board.NUM_SQUARES
+            if not position.is_empty(square):
+                return None
+            piece_name = '+' + piece if is_promoted else piece
+            piece_name = piece_name.upper() if side is player.UPPER else piece_name
+            # an unpromoted pawn can't stand on the last row or on a file with another pawn of its player
+            if piece_name == 'p' or piece_name == 'P':
+                if square // game_board.NUM_COLS == piece_util.PROMOTION_RANK[side]:
+                    return None
+                if position.bitboards[piece_name] & game_board.FILE_MASKS[square % game_board.NUM_COLS]:
+                    return None
+            position.place_piece(piece_name, square)
+        position.set_captures(captures[player.LOWER], captures[player.UPPER])
+        position.set_side_to_move(side_to_move)
+
+        if piece_util.is_in_check(position, 1 - side_to_move):
+            return None
+        return position
+
+    def generate(self, debug_mode=False):
+        ''' Return type void
+
+        Fills the table by retrograde analysis. Every legal position is linked to the
+        positions its legal moves lead to, and positions without legal moves are lost for
+        the side to move. Working backwards one ply at a time from the lost positions, a
+        position is won if any move leads to a lost position, and lost once every move
+        leads to a won position. Positions that are never reached this way are draws.
+
+        The links are kept in flat arrays of 32-bit indexes rather than Python lists: the
+        children of every position in the order of the positions, and then the same links
+        sorted by child, so the parents of a position are a slice between two offsets.
+        '''
+        start_time = time.time()
+        entries = array.array('H', [ILLEGAL_ENTRY]) * self.num_entries
+        num_unresolved_moves = array.array('H', [0]) * self.num_entries
+        children = array.array('I')
+        child_offsets = array.array('I', [0]) * (self.num_entries + 1)
+        frontier = []
+
+        for index in range(self.num_entries):
+            position = self.build_position(index)
+            if position is not None:
+                entries[index] = DRAW_ENTRY
+                moves = piece_util.generate_legal_moves(position)
+                num_unresolved_moves[index] = len(moves)
+                if not moves:
+                    entries[index] = 1
+                    frontier.append(index)
+                for move in moves:
+                    position.make_move(move)
+                    children.append(self.compute_index(position))
+                    position.unmake_move()
+            child_offsets[index + 1] = len(children)
+
+        # the parents of each child start at its offset, which is the number of links to the children before it
+        parent_offsets = array.array('I', [0]) * (self.num_entries + 1)
+        for child in children:
+            parent_offsets[child + 1] += 1
+        for index in range(self.num_entries):
+            parent_offsets[index + 1] += parent_offsets[index]
+        parents = array.array('I', [0]) * len(children)
+        next_parent = array.array('I', parent_offsets)
+        for index in range(self.num_entries):
+            for child in children[child_offsets[index]:child_offsets[index + 1]]:
+                parents[next_parent[child]] = index
+                next_parent[child] += 1
+        del children, child_offsets, next_parent
+
+        if debug_mode:
+            print("Linked " + str(self.num_entries) + " positions in " + "{:.3f}".format(time.time() - start_time) + " seconds")
+
+        plies = 0
+        while frontier:
+            next_frontier = []
+            for index in frontier:
+                for parent in parents[parent_offsets[index]:parent_offsets[index + 1]]:
+                    if entries[parent] != DRAW_ENTRY:
+                        continue
+                    # an even number of plies means the side to move at index is checkmated
+                    if plies % 2 == 0:
+                        entries[parent] = plies + 2
+                        next_frontier.append(parent)
+                    else:
+                        num_unresolved_moves[parent] -= 1
+                        if num_unresolved_moves[parent] == 0:
+                            entries[parent] = plies + 2
+                            next_frontier.append(parent)
+            frontier = next_frontier
+            plies += 1
+
+        self.entries = entries
+        if debug_mode:
+            print("Generated the " + self.material + " tablebase in " + "{:.3f}".format(time.time() - start_time) + " seconds")
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, TABLEBASE_MAGIC, TABLEBASE_VERSION, self.num_entries, self.material.encode('ascii')))
+            f.write(self.entries.tobytes() if sys.byteorder == 'little' else self.byteswapped_entries())
+
+    def byteswapped_entries(self):
+        entries = array.array('H', self.entries)
+        entries.byteswap()
+        return entries.tobytes()
+
+    def get_entry(self, index):
+        if isinstance(self.entries, array.array):
+            return self.entries[index]
+        return struct.unpack_from(ENTRY_FORMAT, self.entries, HEADER_SIZE + index * ENTRY_SIZE)[0]
+
+    def probe(self, board):
+        ''' Returns a tuple of (result, plies) for the side to move or None
+
+        The result is WIN, LOSS or DRAW, and plies is the number of plies until
+        checkmate if both players play their best moves, which is 0 if the side to
+        move is checkmated already. None is returned if the position has different
+        material than the table or is not a position that can come up in a game.
+        '''
+        index = self.compute_index(board)
+        if index is None:
+            return None
+        entry = self.get_entry(index)
+        if entry == ILLEGAL_ENTRY:
+            return None
+        if entry == DRAW_ENTRY:
+            return DRAW, 0
+        plies = entry - 1
+        return (WIN if plies % 2 else LOSS), plies
+
+    def close(self):
+        if self.tablebase_file is not None:
+            self.entries.close()
+            self.tablebase_file.close()
+            self.tablebase_file = None
+        self.entries = None
+
+
+def load_tablebase(filename):
+    ''' Returns a Tablebase whose entries are read from the memory mapped file on demand '''
+    try:
+        tablebase_file = open(filename, 'rb')
+        entries = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_entries, material = struct.unpack_from(HEADER_FORMAT, entries, 0)
+    except (IOError, ValueError, struct.error):
+        print("There was an error reading the tablebase file: " + str(filename) + ". Exiting...")
+        sys.exit()
+
+    tablebase = Tablebase(material.rstrip(b'\0').decode('ascii'))
+    if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION or num_entries != tablebase.num_entries \
+            or len(entries) != HEADER_SIZE + num_entries * ENTRY_SIZE:
+        print("The tablebase file " + str(filename) + " is not a valid tablebase. Exiting...")
+        sys.exit()
+    tablebase.entries = entries
+    tablebase.tablebase_file = tablebase_file
+    return tablebase
+
+
+def build_tablebase(material, filename, debug_mode=False):
+    ''' Return type void
+
+    Generates the tablebase for the material, saves it to the file and prints how many
+    positions are won, lost and drawn for the side to move.
+    '''
+    tablebase = Tablebase(material)
+    # the table is generated in memory, so one that is too large is refused before anything is allocated
+    if tablebase.num_entries > MAX_TABLEBASE_ENTRIES:
+        print("The " + tablebase.material + " tablebase has " + str(tablebase.num_entries) + " entries, more than the "
+              + str(MAX_TABLEBASE_ENTRIES) + " that can be generated. Use at most two pieces besides the kings. Exiting...")
+        sys.exit()
+    start_time = time.time()
+    tablebase.generate(debug_mode)
+    tablebase.save(filename)
+
+    entries = tablebase.entries
+    num_illegal = entries.count(ILLEGAL_ENTRY)
+    num_draws = entries.count(DRAW_ENTRY)
+    num_wins = sum(1 for x in entries if x != ILLEGAL_ENTRY and x != DRAW_ENTRY and (x - 1) % 2)
+    print("Material: " + tablebase.material)
+    print("Positions: " + str(tablebase.num_entries - num_illegal))
+    print("Wins: " + str(num_wins))
+    print("Losses: " + str(tablebase.num_entries - num_illegal - num_draws - num_wins))
+    print("Draws: " + str(num_draws))
+    print("Longest checkmate: " + str(max([x - 1 for x in entries if x != ILLEGAL_ENTRY and x != DRAW_ENTRY] or [0])) + " plies")
+    print("Time: " + "{:.3f}".format(time.time() - start_time) + " seconds")
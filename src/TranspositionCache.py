@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class TranspositionCache(object):
+    ''' Bounded cache of results derived from a position
+
+    Entries are keyed on a tuple that starts with the kind of result being stored
+    (e.g. 'check' or 'legal_moves') and includes the Zobrist hash of the position,
+    so positions that repeat during a game are only analyzed once. When the cache is
+    full, the least recently used entry is evicted. The hit and miss counters can be
+    used to decide how large the cache should be.
+    '''
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        ''' Returns the value stored for the key or None if the key is not cached '''
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        return dict(hits=self.hits, misses=self.misses, entries=len(self.entries), max_entries=self.max_entries)
@@ -1,4 +1,5 @@
 import os
+import sys
 
 def _stringifySquare(sq):
 
@@ -39,8 +40,51 @@ def parseTestCase(path):
     moves: list of move elements - 'move|drop origin destination'
     initialPieces: list of elements - {'piece': 'k', 'position': 'a1'}
     '''
-    f = open(path)
+    with open(path) as f:
+        return _readTestCase(f, False)
+
+
+def iterateTestCases(path):
+    ''' Yields a dict() like the one returned by parseTestCase for every game in a file or directory
+
+    A file can hold many games one after another, separated by an empty line after the
+    moves of each game. For a directory, every .in file in it is read in order of its
+    name. Only one game is held in memory at a time and each file is read through a
+    single buffered handle, so any number of games can be read. If a game can't be
+    parsed, the file and the number of the game in it are printed and the program exits.
+    '''
+    if os.path.isdir(path):
+        paths = [os.path.join(path, x) for x in sorted(os.listdir(path)) if x.endswith('.in')]
+    else:
+        paths = [path]
+
+    for path in paths:
+        with open(path) as f:
+            gameNumber = 0
+            while True:
+                gameNumber += 1
+                try:
+                    testCase = _readTestCase(f, True)
+                except ValueError:
+                    print("There was an error parsing game " + str(gameNumber) + " of the input file: " + str(path) + ". Exiting...")
+                    sys.exit()
+                if testCase is None:
+                    break
+                yield testCase
+
+
+def _readTestCase(f, manyGames):
+    ''' Returns the next game read from the file, or None if there are no more games in a file of many games
+
+    In a file of many games, the empty lines between games are skipped and the moves of a
+    game end at the next empty line. Otherwise the moves are read up to the end of the file.
+    '''
     line = f.readline()
+    if manyGames:
+        while line == '\n':
+            line = f.readline()
+        if line == '':
+            return None
 
     initialBoardState = []
     while line != '\n':
@@ -54,7 +98,7 @@ def parseTestCase(path):
     line = f.readline()
     line = f.readline()
     moves = []
-    while line != '':
+    while line != '' and not (manyGames and line == '\n'):
         moves.append(line.strip())
         line = f.readline()
 
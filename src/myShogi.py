@@ -1,33 +1,238 @@
+import argparse
 import sys
 import Game as game
+import Perft as perft
+import Batch as batch
+import Search as search
+import Analyze as analyze
+import Tablebase as tablebase_util
+import GameRecord as game_record
+import BatchEvaluate as batch_evaluate
+import Profile as profile
+import Server as server
+import ReplayIndex as replay_index
+import SelfPlay as self_play
+import MateSearch as mate_search
+import PositionDatabase as position_database
+
+
+def parse_arguments(args):
+    parser = argparse.ArgumentParser(description="Play mini shogi from the command line.")
+    parser.add_argument('-d', dest='debug_mode', action='store_true', help="print debug output while playing")
+    parser.add_argument('-i', dest='interactive', action='store_true', help="play a game from the beginning state")
+    parser.add_argument('-f', dest='filename', help="play the moves in a game file and then continue interactively")
+    parser.add_argument('-p', dest='position_string', metavar='POSITION',
+                        help="play from a one-line position string like 'RBSGK/4P/5/p4/kgsbr l - 1'")
+    parser.add_argument('-perft', dest='perft_depth', type=int, metavar='N',
+                        help="count the leaf nodes of the legal move tree N plies deep from the starting position "
+                             "the -p position or the position after the moves in the -f file")
+    parser.add_argument('-ai', dest='ai_player_name', choices=['lower', 'UPPER'],
+                        help="let the computer play the moves of the given player")
+    parser.add_argument('-time', dest='ai_time_ms', type=int, default=search.DEFAULT_TIME_MS, metavar='MS',
+                        help="milliseconds the computer player can think about each move (default " + str(search.DEFAULT_TIME_MS) + ")")
+    parser.add_argument('-engine', dest='ai_engine', choices=['alphabeta', 'mcts'], default='alphabeta',
+                        help="search used by the computer player (default alphabeta)")
+    parser.add_argument('-playouts', dest='ai_playouts', type=int, metavar='N',
+                        help="most playouts the mcts computer player can run for each move")
+    parser.add_argument('-tablebase', dest='tablebase_filename', metavar='FILE',
+                        help="endgame tablebase used to find checkmates and by the computer player")
+    parser.add_argument('-build-tablebase', dest='tablebase_material', metavar='MATERIAL',
+                        help="generate the endgame tablebase for the pieces other than the kings, e.g. G or RP, "
+                             "and save it to the -tablebase file")
+    parser.add_argument('-analyze', dest='analyze_depth', type=int, metavar='N',
+                        help="score every legal move N plies deep in the -p position or the position after the moves in the -f file")
+    parser.add_argument('-seek', dest='seek_ply', type=int, metavar='N',
+                        help="print the game in the -f file as it was after N plies, where 0 is the starting position")
+    parser.add_argument('-mate', dest='mate_moves', type=int, metavar='N',
+                        help="look for a forced mate within N moves for the player to move in the -p position, "
+                             "the position after the moves in the -f file or the starting position")
+    parser.add_argument('-eval', dest='evaluate', action='store_true',
+                        help="print the score of the starting position, the -p position or the position after the moves in the -f file")
+    parser.add_argument('-batch', dest='batch_path', metavar='PATH',
+                        help="play every .in file in a directory or matching a glob and compare the output with the .out files")
+    parser.add_argument('-games', dest='games_path', metavar='PATH',
+                        help="replay every game in a file of many games or in the .in files of a directory")
+    parser.add_argument('-records', dest='record_filename', metavar='FILE',
+                        help="replay every game in a binary game record file, or the file to write with -convert")
+    parser.add_argument('-convert', dest='convert_path', metavar='PATH',
+                        help="convert every .in file in a directory or matching a glob to the -records file")
+    parser.add_argument('-positions', dest='database_filename', metavar='FILE',
+                        help="position database to look up the -p position or the position and moves of the -f file in, "
+                             "or the file to write with -build-positions")
+    parser.add_argument('-build-positions', dest='database_path', metavar='PATH',
+                        help="count every position and move sequence of the games in the .in files in a directory "
+                             "or matching a glob and save them to the -positions file")
+    parser.add_argument('-selfplay', dest='selfplay_games', type=int, metavar='N',
+                        help="play N games between the -policies and write them to game record shards, one per worker")
+    parser.add_argument('-policies', dest='selfplay_policies', nargs=2, choices=self_play.POLICIES,
+                        default=[self_play.DEFAULT_POLICY, self_play.DEFAULT_POLICY], metavar=('LOWER', 'UPPER'),
+                        help="how the lower and UPPER players choose their moves in -selfplay: " +
+                             ", ".join(self_play.POLICIES) + " (default random random)")
+    parser.add_argument('-shards', dest='shard_prefix', default='selfplay', metavar='PREFIX',
+                        help="-selfplay writes the games of worker W to PREFIX.W.rec (default selfplay)")
+    parser.add_argument('-seed', dest='seed', type=int, metavar='N',
+                        help="random seed of -selfplay, where worker W uses N + W (default random)")
+    parser.add_argument('-merge', dest='merge_path', metavar='PATH',
+                        help="copy the games of every .rec file in a directory or matching a glob to the -records file")
+    parser.add_argument('-batch-eval', dest='batch_eval_filename', metavar='FILE',
+                        help="score every position string in a file, one per line, in batches (needs numpy)")
+    parser.add_argument('-serve', dest='serve_port', type=int, metavar='PORT',
+                        help="host games for clients that connect to PORT on this machine, e.g. with telnet or nc")
+    parser.add_argument('--profile', dest='profile_filename', metavar='FILE',
+                        help="count calls and time spent in each phase of the game and append a JSON summary to FILE")
+    parser.add_argument('-workers', dest='num_workers', type=int, default=1, metavar='N',
+                        help="number of processes used by -batch, -analyze, -selfplay and the mcts engine, 0 for one per core (default 1)")
+    return parser.parse_args(args)
+
+
+def create_position_game(arguments):
+    ''' Returns a Game in the position given with -p, after the moves of the -f file, or at the beginning state '''
+    if arguments.filename:
+        game_instance = game.Game('f', arguments.filename, arguments.debug_mode)
+        game_instance.replay()
+    elif arguments.position_string:
+        game_instance = game.Game('p', None, arguments.debug_mode, position_string=arguments.position_string)
+    else:
+        game_instance = game.Game('i', None, arguments.debug_mode)
+    return game_instance
 
 
 def main():
-    filename = None
-    debug_mode = False
+    arguments = parse_arguments(sys.argv[1:])
+
+    if arguments.profile_filename:
+        profiler = profile.start_profiling()
+        try:
+            run(arguments)
+        finally:
+            profiler.write_summary(arguments.profile_filename)
+    else:
+        run(arguments)
 
-    arg_length = len(sys.argv)
 
-    if arg_length > 5:
-        print("Too many parameters. Exiting...")
+def run(arguments):
+    ''' Return type void
+
+    Runs whichever mode was asked for on the command line.
+    '''
+    if sum(1 for x in [arguments.interactive, arguments.filename, arguments.position_string] if x) > 1:
+        print("Only one of -i, -f and -p can be given. Exiting...")
         sys.exit()
-    else:
-        if sys.argv[1][1] == 'd':
-            debug_mode = True
-            del sys.argv[1]
-            arg_length -= 1
-
-        mode = sys.argv[1][1]
-        if arg_length > 2:
-            filename = sys.argv[2]
-        elif arg_length > 1:
-            mode = sys.argv[1][1]
-        else:
-            print("Too few parameters. Exiting...")
+
+    if arguments.tablebase_material:
+        if not arguments.tablebase_filename:
+            print("-build-tablebase needs the file to save it to given with -tablebase. Exiting...")
+            sys.exit()
+        tablebase_util.build_tablebase(arguments.tablebase_material, arguments.tablebase_filename, arguments.debug_mode)
+        return
+
+    if arguments.games_path:
+        batch.run_games(arguments.games_path)
+        return
+
+    if arguments.convert_path:
+        if not arguments.record_filename:
+            print("-convert needs the file to save the games to given with -records. Exiting...")
+            sys.exit()
+        game_record.convert_game_files(arguments.convert_path, arguments.record_filename)
+        return
+
+    if arguments.database_path:
+        if not arguments.database_filename:
+            print("-build-positions needs the file to save the database to given with -positions. Exiting...")
+            sys.exit()
+        position_database.build_position_database(arguments.database_path, arguments.database_filename)
+        return
+
+    if arguments.database_filename:
+        position_database.run_lookup(arguments.database_filename, create_position_game(arguments))
+        return
+
+    if arguments.merge_path:
+        if not arguments.record_filename:
+            print("-merge needs the file to save the games to given with -records. Exiting...")
             sys.exit()
+        self_play.merge_shards(arguments.merge_path, arguments.record_filename)
+        return
+
+    if arguments.selfplay_games is not None:
+        self_play.run_selfplay(arguments.selfplay_games, arguments.selfplay_policies, arguments.shard_prefix,
+                               arguments.num_workers, arguments.seed)
+        return
+
+    if arguments.record_filename:
+        game_record.run_game_records(arguments.record_filename)
+        return
+
+    if arguments.serve_port is not None:
+        server.run_server(arguments.serve_port, debug_mode=arguments.debug_mode)
+        return
+
+    if arguments.batch_eval_filename:
+        batch_evaluate.evaluate_position_file(arguments.batch_eval_filename)
+        return
+
+    if arguments.batch_path:
+        if not batch.run_batch(arguments.batch_path, arguments.num_workers):
+            sys.exit(1)
+        return
+
+    if arguments.analyze_depth is not None:
+        if not arguments.filename and not arguments.position_string:
+            print("-analyze needs a game file given with -f or a position given with -p. Exiting...")
+            sys.exit()
+        game_instance = create_position_game(arguments)
+        if game_instance.is_game_over:
+            print(game_instance.game_over_message)
+            return
+        analyze.run_analysis(game_instance.game_board, arguments.analyze_depth, arguments.num_workers)
+        return
+
+    if arguments.seek_ply is not None:
+        if not arguments.filename:
+            print("-seek needs a game file given with -f. Exiting...")
+            sys.exit()
+        replay_index.run_seek(arguments.filename, arguments.seek_ply, arguments.debug_mode)
+        return
+
+    if arguments.mate_moves is not None:
+        game_instance = create_position_game(arguments)
+        if game_instance.is_game_over:
+            print(game_instance.game_over_message)
+            return
+        mate_search.run_mate(game_instance.game_board, arguments.mate_moves, game_instance.num_moves)
+        return
+
+    if arguments.evaluate:
+        game_instance = create_position_game(arguments)
+        print(game_instance.current_player.get_name() + " player to move")
+        print("Evaluation: " + str(game_instance.get_evaluation()))
+        return
+
+    if arguments.perft_depth is not None:
+        game_instance = create_position_game(arguments)
+        perft.run_perft(game_instance.game_board, arguments.perft_depth)
+        return
+
+    if arguments.filename:
+        mode = 'f'
+    elif arguments.position_string:
+        mode = 'p'
+    elif arguments.interactive:
+        mode = 'i'
+    else:
+        print("Too few parameters. Exiting...")
+        sys.exit()
+
+    if arguments.ai_playouts is not None and arguments.ai_playouts < 1:
+        print("-playouts needs at least 1 playout. Exiting...")
+        sys.exit()
 
-    game_instance = game.Game(mode, filename, debug_mode)
+    tablebase = tablebase_util.load_tablebase(arguments.tablebase_filename) if arguments.tablebase_filename else None
+    game_instance = game.Game(mode, arguments.filename, arguments.debug_mode, arguments.ai_player_name, arguments.ai_time_ms,
+                              arguments.ai_engine, arguments.ai_playouts, arguments.num_workers, tablebase,
+                              arguments.position_string)
     game_instance.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()